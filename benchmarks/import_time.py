@@ -0,0 +1,85 @@
+"""
+Measures how long it takes to import lieux with its large style tables
+loaded lazily (as lieux does now) and eagerly (as lieux did before, when
+every table was imported along with the modules that use it), and how
+long the first address then takes to format.
+
+Each run happens in a fresh interpreter, so nothing is left over in
+sys.modules between runs. Run it in an environment with Django and
+titlecase installed:
+
+    python benchmarks/import_time.py [runs]
+"""
+# Imports from python.
+import os
+import subprocess
+import sys
+
+
+# Configures just enough of Django for lieux to import, then times the
+# import and the first address formatted (which is when the lazy tables are
+# loaded).
+SNIPPET = """
+import time
+from django.conf import settings
+settings.configure(DATABASES={'default': {}, 'geocoder': {}})
+started = time.time()
+%s
+import lieux.search
+import lieux.formats
+imported = time.time()
+lieux.formats.format_components_in_ap_style(
+    ['333', 'W', 'State', 'St', '', '', 'Milwaukee', 'WI', '53203', 't'])
+formatted = time.time()
+print('%%f %%f' %% (imported - started, formatted - imported))
+"""
+
+# The tables lieux now loads lazily, imported up front for the eager runs.
+EAGER_IMPORTS = """
+import lieux.ap_style, lieux.latstatestyle, lieux.secondary_units
+import lieux.street_suffixes, lieux.us_states
+import lieux.lookups; lieux.lookups.get_token_index()
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_runs(imports, runs):
+    """
+    Runs the snippet (with the given extra imports) in a fresh
+    interpreter the given number of times.
+
+    Returns a list of (import seconds, first format seconds) tuples.
+    """
+    timings = []
+    for i in range(runs):
+        output = subprocess.check_output(
+                [sys.executable, '-c', SNIPPET % imports],
+                cwd=ROOT
+            )
+        timings.append(tuple(float(part) for part in output.split()))
+    return timings
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    runs = 15
+    if len(sys.argv) > 1:
+        runs = int(sys.argv[1])
+
+    print('Median of %s runs, in milliseconds:' % runs)
+    for label, imports in (('Lazy', ''), ('Eager', EAGER_IMPORTS)):
+        timings = time_runs(imports, runs)
+        print('  %-6s import %7.1f   first format %7.1f' % (
+                label,
+                median([timing[0] for timing in timings]) * 1000,
+                median([timing[1] for timing in timings]) * 1000
+            ))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,112 @@
-# Imports from python.
-import re
-
-
 # Imports fron django.
 from django.conf import settings
 
 
 # Imports from lieux.
-from lieux.db_connection import submit_geocoder_query
+from lieux.cache import cache_failure, cache_results, get_cached_results, \
+    get_many_cached_results, get_normalization_cache, raise_cached_failure
+from lieux.db_connection import register_geocoder_statement, \
+    submit_prepared_query
 from lieux.exceptions import AddressInputError, AddressNotFoundError
+from lieux.lookups import DIRECTIONS_RE, HIGHWAY_RE, STATE_ABBREV_RE, \
+    cached_titlecase, lookup, normalize_token
 from lieux.objects import GeocodedAddress
-from lieux.secondary_units import SECONDARY_UNITS_WITHOUT_NUMBERS
-from lieux.style import DIRECTION_LOOKUPS, HIGHWAYS_TO_GEOCODER, \
-    HIGHWAYS_TO_STYLE, KNOWN_STATE_ABBREVS, TEXTUAL_TO_NUMERIC_ORDINALS
+from lieux.parser import parse_address, parse_grid_number, \
+    split_grid_number, split_secondary_unit
+from lieux.style import HIGHWAYS_TO_GEOCODER, KNOWN_STATE_ABBREVS, \
+    TEXTUAL_TO_NUMERIC_ORDINALS
+
+
+# A marker for addresses that aren't in the normalization cache (as opposed to
+# those cached as having no valid normalization).
+NOT_CACHED = object()
+
+
+# The fields of PostGIS' norm_addy type, in the same order as lieux's address
+# components. Each is selected as its own column (see select_addy_fields), so
+# values come back typed and intact instead of packed into one composite
+# string that has to be split apart (and that splits wrongly wherever a value
+# contains a comma).
+ADDY_FIELDS = (
+    'address',
+    'predirabbrev',
+    'streetname',
+    'streettypeabbrev',
+    'postdirabbrev',
+    'internal',
+    'location',
+    'stateabbrev',
+    'zip',
+    'parsed',
+)
+
+
+def select_addy_fields(addy):
+    """
+    Given the SQL expression for a norm_addy value (exempli gratia,
+    'g.addy'), returns the columns that select each of its fields, in
+    the order of ADDY_FIELDS.
+    """
+    return ", ".join("(%s).%s" % (addy, field) for field in ADDY_FIELDS)
+
+
+def unpack_addy_fields(values):
+    """
+    Given the norm_addy columns of a row (in the order of ADDY_FIELDS),
+    unpacks them into a list of address components: strings, with nulls
+    as empty strings, the address number as a string and the parsed flag
+    as 't' or 'f'.
+    """
+    (number, predirection, street, street_type, postdirection, unit, city,
+            state, zip_code, parsed) = values
+    return [
+        '' if number is None else str(number),
+        predirection or '',
+        street or '',
+        street_type or '',
+        postdirection or '',
+        unit or '',
+        city or '',
+        state or '',
+        zip_code or '',
+        't' if parsed else 'f',
+    ]
 
 
-# Imports from other dependencies.
-from titlecase import titlecase
+# Register the statements this module sends to the geocoder.
+# Pass the maximum number of results through to geocode() (and limit the
+# rows returned) so the database only ranks and sends back what we'll use.
+register_geocoder_statement(
+        'geocode_address',
+        ['text', 'integer'],
+        "SELECT g.rating, ST_Y(g.geomout) As lat, ST_X(g.geomout) As lon, %s"
+        " FROM geocode($1, $2) AS g"
+        " ORDER BY g.rating LIMIT $2" % select_addy_fields('g.addy')
+    )
+# Geocode a batch in one query by unnesting an array of the formatted
+# addresses and joining every element laterally to geocode(). The ordinality
+# column tells us which input each row belongs to.
+register_geocoder_statement(
+        'geocode_addresses',
+        ['text[]', 'integer'],
+        "SELECT i.idx, g.rating, ST_Y(g.geomout) As lat,"
+        " ST_X(g.geomout) As lon, %s"
+        " FROM unnest($1) WITH ORDINALITY AS i(address, idx)"
+        " CROSS JOIN LATERAL geocode(i.address, $2) AS g"
+        " ORDER BY i.idx, g.rating" % select_addy_fields('g.addy')
+    )
+# Normalize a batch by unnesting an array of all the addresses, so each one's
+# normalized value comes back on its own row, in input order. (Calling
+# normalize_address() laterally, rather than in the select list, runs it just
+# once per address however many of its fields we select.)
+register_geocoder_statement(
+        'normalize_addresses',
+        ['text[]'],
+        "SELECT %s"
+        " FROM unnest($1) WITH ORDINALITY AS i(address, idx)"
+        " CROSS JOIN LATERAL normalize_address(i.address) AS n"
+        " ORDER BY i.idx" % select_addy_fields('n')
+    )
 
 
 def format_for_geocoder(components):
@@ -41,22 +131,22 @@ def format_for_geocoder(components):
     if components_to_geocode[0] != '':
         line_1_components.append(components_to_geocode[0])
 
-    if components_to_geocode[3].lower() in HIGHWAYS_TO_STYLE.keys() \
-            and components_to_geocode[2].strip('"') != '':
-        if components_to_geocode[1].strip('"') != '':
-            line_1_components.append(components_to_geocode[1].strip('"'))
-        line_1_components.append(components_to_geocode[3].strip('"'))
-        line_1_components.append(components_to_geocode[2].strip('"'))
-        if components_to_geocode[4].strip('"') != '':
-            line_1_components.append(components_to_geocode[4].strip('"'))
+    if lookup(normalize_token(components_to_geocode[3])).highway \
+            and components_to_geocode[2] != '':
+        if components_to_geocode[1] != '':
+            line_1_components.append(components_to_geocode[1])
+        line_1_components.append(components_to_geocode[3])
+        line_1_components.append(components_to_geocode[2])
+        if components_to_geocode[4] != '':
+            line_1_components.append(components_to_geocode[4])
     else:
-        line_1_components = [cpnt.strip('"') for cpnt \
+        line_1_components = [cpnt for cpnt \
                 in components_to_geocode[:5] if cpnt != '']
-    line_1 = " ".join(cpnt.strip('"') for cpnt in line_1_components)
-    line_2 = " ".join(cpnt.strip('"') for cpnt in components_to_geocode[6:] \
+    line_1 = " ".join(line_1_components)
+    line_2 = " ".join(cpnt for cpnt in components_to_geocode[6:] \
                                         if cpnt != '')
 
-    return " ".join([line_1, line_2]).replace("'", "''")
+    return " ".join([line_1, line_2])
 
 
 def geocode_address(address, max_results=10, db_alias=None):
@@ -87,12 +177,215 @@ def geocode_address(address, max_results=10, db_alias=None):
                 'geocoder'
             )
 
-    # Normalize the address.
-    normalized_address = normalize_address(
-            address,
-            db_alias
+    # If this address failed to geocode recently, fail the same way again
+    # without going to the database.
+    raise_cached_failure('address', address, db_alias)
+
+    try:
+        # Normalize the address and format it for the geocoder. (Repeat
+        # addresses are normalized from the normalization cache.)
+        normalized_address = normalize_address(
+                address,
+                db_alias
+            )
+        geocoder_formatted_address = prepare_for_geocoder(normalized_address)
+
+        # If results for this normalized address have already been cached,
+        # return them. Keying on the normalized components means every
+        # spelling of the same address shares one cached result.
+        cached_results = get_cached_results(
+                'address',
+                normalized_address,
+                max_results,
+                db_alias
+            )
+        if cached_results is not None:
+            return cached_results
+
+        # Finally, submit the query and return the results.
+        geocode_results = submit_prepared_query(
+                'geocode_address',
+                [geocoder_formatted_address, max_results],
+                db_alias
+            )
+
+        # Raise an appropriate error if no matching addresses were found.
+        if not geocode_results:
+            raise AddressNotFoundError(
+                    'No address found that matches the input.'
+                )
+    except (AddressInputError, AddressNotFoundError) as error:
+        cache_failure('address', address, db_alias, error)
+        raise
+
+    # Finally, create a GeocodedAddress object for each match and return a
+    # list of all results. (The query has already limited these to the
+    # maximum number of results we are to return.)
+    geocoded_objects = []
+    for result in geocode_results:
+        geocoded_objects.append(
+                build_geocoded_address(result, normalized_address)
+            )
+
+    cache_results(
+            'address',
+            normalized_address,
+            max_results,
+            db_alias,
+            geocoded_objects
         )
 
+    return geocoded_objects
+
+
+def geocode_addresses(addresses, max_results=10, db_alias=None,
+                      batch_size=500):
+    """
+    Given an iterable of addresses, approximate the physical location of
+    each using the geocoding tool built into PostGIS v2.0. Rather than
+    making round trips for each address, the addresses are normalized
+    together in one query and geocoded together in another, per batch.
+
+    Takes one required and three optional arguments:
+        *   addresses: an iterable of addresses to be geocoded.
+        -   max_results: the number of matching address results to be
+                returned for each address. Defaults to ten results.
+        -   db_alias: the name given to the geocoder's database in your
+                settings.py file. Defaults to None (though a null value
+                will be overridden in lines 267-272).
+        -   batch_size: the number of addresses to normalize and
+                geocode in each pair of queries. Defaults to 500.
+
+    Returns a dict with the position of each address in the input as
+    its keys and, as its values, lists of lieux.objects.GeocodedAddress
+    objects for that address. Addresses that couldn't be parsed or
+    that had no matches are given an empty list.
+    """
+    # Unless otherwise specified, the database alias will be that which has
+    # been specified in settings.GEOCODER_DB_ALIAS (or, failing that, the
+    # string 'geocoder').
+    if not db_alias:
+        db_alias = getattr(
+                settings,
+                'GEOCODER_DB_ALIAS',
+                'geocoder'
+            )
+
+    addresses = list(addresses)
+    results = {}
+    for batch_start in range(0, len(addresses), batch_size):
+        batch_addresses = addresses[batch_start:batch_start + batch_size]
+
+        # Normalize the whole batch at once, setting aside those addresses
+        # that can't be parsed.
+        normalized_batch = []
+        normalized_addresses = normalize_addresses(batch_addresses, db_alias)
+        for offset, normalized_address in enumerate(normalized_addresses):
+            index = batch_start + offset
+            results[index] = []
+            try:
+                geocoder_formatted_address = prepare_for_geocoder(
+                        normalized_address
+                    )
+            except AddressInputError:
+                continue
+            normalized_batch.append(
+                    (index, normalized_address, geocoder_formatted_address)
+                )
+
+        # Fill in whichever addresses' results are already cached (under
+        # their normalized components), and geocode only the rest.
+        cached_results = get_many_cached_results(
+                'address',
+                [item[1] for item in normalized_batch],
+                max_results,
+                db_alias
+            )
+        batch = []
+        for position, item in enumerate(normalized_batch):
+            if position in cached_results:
+                results[item[0]] = cached_results[position]
+            else:
+                batch.append(item)
+
+        if not batch:
+            continue
+
+        # Geocode the batch in one query (see the 'geocode_addresses'
+        # statement registered at the top of this module).
+        geocode_results = submit_prepared_query(
+                'geocode_addresses',
+                [[item[2] for item in batch], max_results],
+                db_alias
+            )
+
+        # Ordinality is one-based, so shift each row's index back by one to
+        # find its place in this batch.
+        for result in geocode_results or []:
+            index, normalized_address = batch[result[0] - 1][:2]
+            if len(results[index]) < max_results:
+                results[index].append(
+                        build_geocoded_address(result[1:], normalized_address)
+                    )
+
+        for item in batch:
+            if results[item[0]]:
+                cache_results(
+                        'address',
+                        item[1],
+                        max_results,
+                        db_alias,
+                        results[item[0]]
+                    )
+
+    return results
+
+
+def build_geocoded_address(result, normalized_address):
+    """
+    Given a row returned by the geocoder and the normalized address it
+    was generated from, builds a GeocodedAddress object for that row.
+
+    Takes two required arguments:
+        *   result: a tuple of the rating, latitude and longitude
+                columns for this match, followed by its norm_addy
+                columns (see select_addy_fields).
+        *   normalized_address: the list of normalized address
+                components the geocoder's input was formatted from.
+
+    Returns a lieux.objects.GeocodedAddress object.
+    """
+    result_object = GeocodedAddress(
+        result[0],
+        result[1],
+        result[2],
+        unpack_addy_fields(result[3:]))
+
+    # The geocoder drops apartment numbers, so carry over the one from the
+    # normalized input (if there was one).
+    if normalized_address[5] != '':
+        result_object.components.unit = normalized_address[5]
+
+    # Likewise keep the Wisconsin grid number the address was given with.
+    if parse_grid_number(normalized_address[0]):
+        result_object.components.number = normalized_address[0]
+
+    return result_object
+
+
+def prepare_for_geocoder(normalized_address):
+    """
+    Given a normalized address, fills in the default state (if needed)
+    and formats it for the geocoder.
+
+    Takes one required argument:
+        *   normalized_address: the list of normalized address
+                components, as returned by normalize_address().
+
+    Returns the string to be sent to the geocoder (with the house
+    number standing in for a grid number, if the address has one).
+    Raises an AddressInputError if the address couldn't be normalized.
+    """
     if not normalized_address:
         raise AddressInputError("Invalid address.")
 
@@ -104,42 +397,19 @@ def geocode_address(address, max_results=10, db_alias=None):
                 'Wisconsin'
             )
 
-    # Format the result for the geocoder.
-    geocoder_formatted_address = format_for_geocoder(normalized_address)
-
-    # Next construct the geocoding query to execute in the next step.
-    geocode_query = "SELECT g.rating, ST_Y(g.geomout) As lat," \
-        " ST_X(g.geomout) As lon, (addy), pprint_addy(addy) FROM" \
-        " geocode('%(formatted_address)s') AS g;"
-
-    # Finally, submit the query and return the results.
-    geocode_results = submit_geocoder_query(
-            geocode_query % dict(
-                    formatted_address=geocoder_formatted_address
-                ),
-            db_alias
-        )
+    # TIGER has no house numbers for out-state Wisconsin grid addresses, so
+    # send the geocoder the plain house number that stood in for the grid
+    # number during normalization (see split_grid_number). The normalized
+    # address keeps the grid number, which build_geocoded_address() puts
+    # back on each result.
+    components = normalized_address
+    grid_number = parse_grid_number(normalized_address[0])
+    if grid_number:
+        components = list(normalized_address)
+        components[0] = grid_number[3]
 
-    # Raise an appropriate error if no matching addresses were found.
-    if not geocode_results:
-        raise AddressNotFoundError('No address found that matches the input.')
-
-    # Finally, create a GeocodedAddress object for each match and append it to
-    # a list of all results.
-    geocoded_objects = []
-    for result in geocode_results:
-        result_object = GeocodedAddress(
-            result[0],
-            result[1],
-            result[2],
-            result[3].strip('()').split(','))
-        if normalized_address[5] != '':
-            result_object.components[5] = normalized_address[5]
-        geocoded_objects.append(result_object)
-
-    # Return the first n results to the user, where n is the maximum number of
-    # results we are to return.
-    return geocoded_objects[:max_results]
+    # Format the result for the geocoder.
+    return format_for_geocoder(components)
 
 
 def normalize_address(address, db_alias=None, additional_street_styles=None):
@@ -152,7 +422,7 @@ def normalize_address(address, db_alias=None, additional_street_styles=None):
         *   address: the address to be normalized.
         -   db_alias: the name given to the geocoder's database in your
                 settings.py file. Defaults to None (though a null value
-                will be overridden in lines 41-46).
+                will be overridden by normalize_addresses()).
         -   additional_street_styles: A dict of dicts, with first-level
                 keys specifying city and second-level keys specifying
                 the names of streets in this city that should be changed
@@ -163,6 +433,37 @@ def normalize_address(address, db_alias=None, additional_street_styles=None):
     Returns a string representing the normalized address, if results
     were generated. Otherwise returns a value of None.
     """
+    return normalize_addresses(
+            [address],
+            db_alias,
+            additional_street_styles
+        )[0]
+
+
+def normalize_addresses(addresses, db_alias=None,
+                        additional_street_styles=None):
+    """
+    Given a database alias (as set forth in Django's settings) and a
+    list of addresses to normalize, connects to that database, fires a
+    single normalization query for all of them and returns the
+    resultant normalized addresses.
+
+    Takes one required and two optional arguments:
+        *   addresses: a list of the addresses to be normalized.
+        -   db_alias: the name given to the geocoder's database in your
+                settings.py file. Defaults to None (though a null value
+                will be overridden in lines 470-475).
+        -   additional_street_styles: A dict of dicts, with first-level
+                keys specifying city and second-level keys specifying
+                the names of streets in this city that should be changed
+                before they are passed into the geocoder. The second-
+                level keys will be replaced with the respective values.
+                Optional, and defaults to None.
+
+    Returns a list the same length as addresses, holding the normalized
+    address components for each address that could be normalized and a
+    value of None for each that could not.
+    """
     # Unless otherwise specified, the database alias will be that which has
     # been specified in settings.GEOCODER_DB_ALIAS (or, failing that, the
     # string 'geocoder').
@@ -173,93 +474,178 @@ def normalize_address(address, db_alias=None, additional_street_styles=None):
                 'geocoder'
             )
 
-    # First check if the address contains a hash (which would be followed by an
-    # apartment number). If so, filter this out and replace it with 'apt.'
-    pound_re = re.compile(r'#')
-    unit_number = None
-    if pound_re.search(address) != None:
-        unit_number = address.split('#')[1].split(' ')[0].strip(",")
-        if not unit_number.isdigit():
-            if unit_number.lower() in SECONDARY_UNITS_WITHOUT_NUMBERS.keys():
-                new_address_parts = [
-                    address[:pound_re.search(address).start() - 1],
-                    SECONDARY_UNITS_WITHOUT_NUMBERS[unit_number.lower()],
-                    address[pound_re.search(address).end() +
-                            len(unit_number) + 1:]
-                ]
-                address = " ".join(item for item in new_address_parts)
-            else:
-                address = pound_re.sub('Apt. ', address)
+    if not addresses:
+        return []
+
+    cleaned_addresses = [
+        clean_address_for_normalizer(address) for address in addresses
+    ]
+
+    # Normalization is deterministic for a given cleaned address, default
+    # state and set of street styles, so check the normalization cache first.
+    # Only the addresses it doesn't have (counting each just once) need to
+    # be sent to the geocoder.
+    cache = get_normalization_cache()
+    cache_keys = [
+        normalization_cache_key(address, db_alias, additional_street_styles)
+        for address in cleaned_addresses
+    ]
+    normalized = {}
+    to_normalize = []
+    fast_normalizer = getattr(settings, 'GEOCODER_FAST_NORMALIZER', True)
+    for raw_address, address, cache_key in zip(addresses, cleaned_addresses,
+                                               cache_keys):
+        if cache_key in normalized:
+            continue
+        cached = NOT_CACHED
+        if cache is not None:
+            cached = cache.get(cache_key, NOT_CACHED)
+        if cached is not NOT_CACHED:
+            normalized[cache_key] = cached
+            continue
+
+        # Out-state Wisconsin grid numbers (N109W1711) mean nothing to the
+        # parser or to PostGIS, so normalize the address with a plain house
+        # number standing in and put the grid number back afterward. Take
+        # out any secondary unit the same way, so it can't be mistaken for
+        # part of the street or city.
+        grid_number, raw_address = split_grid_number(raw_address)
+        unit, raw_address = split_secondary_unit(raw_address)
+        if grid_number or unit:
+            address = clean_address_for_normalizer(raw_address)
+
+        # Plain addresses can be parsed without a trip to the database (this
+        # needs the raw address, since its commas help mark where the street
+        # ends). Anything the parser isn't sure of goes to PostGIS.
+        parsed = None
+        if fast_normalizer:
+            parsed = parse_address(raw_address)
+        if parsed:
+            normalized[cache_key] = restore_components(
+                    process_normalized_address(
+                            parsed,
+                            db_alias,
+                            additional_street_styles
+                        ),
+                    grid_number,
+                    unit
+                )
+            if cache is not None:
+                cache.set(cache_key, normalized[cache_key])
         else:
-            address = pound_re.sub('Apt. ', address)
+            to_normalize.append((cache_key, address, grid_number, unit))
+            normalized[cache_key] = NOT_CACHED
+
+    if to_normalize:
+        # Then execute the query on our given geocoder database.
+        result = submit_prepared_query(
+                'normalize_addresses',
+                [[item[1] for item in to_normalize]],
+                db_alias
+            )
 
-    # Remove all punctuation from the raw address string.
-    address = address.replace(',', '').replace('.', '').replace("'", "''")
+        # Run our own post-processing over each normalized result, and cache
+        # what comes out.
+        for (cache_key, address, grid_number, unit), row in zip(to_normalize,
+                                                                result):
+            normalized[cache_key] = restore_components(
+                    process_normalized_address(
+                            unpack_addy_fields(row),
+                            db_alias,
+                            additional_street_styles
+                        ),
+                    grid_number,
+                    unit
+                )
+            if cache is not None:
+                cache.set(cache_key, normalized[cache_key])
+
+    # Finally, hand back a copy of each result so callers can't alter the
+    # cached lists.
+    return [
+        list(normalized[cache_key]) if normalized[cache_key] else None
+        for cache_key in cache_keys
+    ]
 
-    # Now build the query.
-    query = "SELECT normalize_address('%(address)s');"
 
-    # Then execute the query on our given geocoder database. Split our result
-    # into a list of address components.
-    result = submit_geocoder_query(
-            query % dict(
-                    address=address
-                ),
-            db_alias
-        )
-    result_components = result[0][0].strip('()').split(',')
+def restore_components(components, grid_number, unit):
+    """
+    Given a list of normalized address components, and the Wisconsin
+    grid number and secondary unit (if any) that were taken out of the
+    address before it was normalized, puts them back: the grid number in
+    place of the house number and the unit, untouched, as the address'
+    unit.
 
-    # Now, concatenate and return the result if there is one. Else return a
-    # value of None.
-    if [i for i in result_components[:-1] if i.replace('"', '') != ''] == []:
-        return None
+    Returns the list of components (or None, if there weren't any).
+    """
+    if components:
+        if grid_number:
+            components[0] = grid_number
+        if unit:
+            components[5] = unit
+    return components
 
-    result_components = [
-        component.replace('"', '').replace("''", "'") for component
-        in result_components
-    ]
 
-    # Now we check to see if there was a non-numeric apartment number the
-    # normalizer truncated from our address. If so, append three zeroes before
-    # this number and return that to the calling function.
-    if result_components[5] != '':
-        if result_components[6] != '' and result_components[7] != '':
-            # First check if the first word in the city name is a number. If so
-            # it was misappropriated from the apartment number. Take it back.
-            if result_components[6].split(' ')[0].isdigit():
-                result_components[6] = " ".join(
-                        result_components[6].split(' ')[1:]
-                    )
-            # Capture the unique unit number
-            unit_number = address.upper().split(
-                    result_components[6].upper()
-                )[0].strip().split(' ')[-1]
-            # If the unit number's not already in the apartment number
-            # address component, place it in there.
-            if (' ' + unit_number) not in result_components[5]:
-                result_components[5] = " ".join([
-                        result_components[5],
-                        unit_number
-                    ])
-        # If there is a postal code but no state, handle things slightly
-        # differently.
-        elif result_components[8] != '':
-            result_components[5] = " ".join([
-                    result_components[5],
-                    result_components[6].split(' ')[0]
-                ])
-            result_components[6] = " ".join(
-                    result_components[6].split(' ')[1:]
-                )
+def normalization_cache_key(address, db_alias, additional_street_styles):
+    """
+    Given a cleaned address, a database alias and a dict of additional
+    street styles, builds the key under which that address'
+    normalization is cached.
+    """
+    street_styles = None
+    if additional_street_styles:
+        street_styles = tuple(sorted(
+            (city, tuple(sorted(streets.items())))
+            for city, streets in additional_street_styles.items()
+        ))
+    return (
+        address,
+        db_alias,
+        getattr(settings, 'DEFAULT_GEOCODER_STATE', 'Wisconsin'),
+        street_styles
+    )
+
+
+def clean_address_for_normalizer(address):
+    """
+    Given a raw address, prepares it to be sent to PostGIS'
+    normalize_address function.
+
+    Takes one required argument:
+        *   address: the address to be cleaned.
+
+    Returns a string representing the cleaned address.
+    """
+    # Remove all punctuation from the raw address string. (Secondary units,
+    # including those marked with a '#', have already been taken out by
+    # lieux.parser.split_secondary_unit.)
+    return address.replace(',', '').replace('.', '').replace('#', '')
+
+
+def process_normalized_address(result_components, db_alias=None,
+                               additional_street_styles=None):
+    """
+    Given the components an address was normalized into (by PostGIS'
+    normalize_address function or by lieux.parser.parse_address),
+    corrects the parts of the address PostGIS tends to get wrong
+    (non-USPS state abbreviations, highways, ordinals and custom street
+    spellings).
 
-        # If the PostGIS geocoder didn't recognize a street name, retrieve it
-        # ourselves from the original address.
-        if result_components[2] == '':
-            result_components[2] = " ".join(address.split(
-                    result_components[0])[1].split(
-                            result_components[5]
-                        )[:-1]
-                ).strip(' ')
+    Takes one required and two optional arguments:
+        *   result_components: a list of the normalized components, in
+                the order of PostGIS' (addy) object.
+        -   db_alias: the name given to the geocoder's database in your
+                settings.py file. Defaults to None.
+        -   additional_street_styles: A dict of dicts, as described in
+                normalize_address(). Optional, and defaults to None.
+
+    Returns a list of the normalized address components, if the address
+    could be normalized. Otherwise returns a value of None.
+    """
+    # Concatenate and return the result if there is one. Else return a
+    # value of None.
+    if [i for i in result_components[:-1] if i != ''] == []:
+        return None
 
     # Next see if the geocoder misread a non-USPS standard state abbreviation
     # as part of the city name. If there's no state specified and a Django-
@@ -268,14 +654,14 @@ def normalize_address(address, db_alias=None, additional_street_styles=None):
     if result_components[7] == '':
         city_to_compare = result_components[6].strip().replace(',',
                 '').replace('.', '').lower()
-        for state_abbrev in KNOWN_STATE_ABBREVS.keys():
-            abbrev_regex = re.compile(r'(^|\W)%s' % state_abbrev.lower())
-            if abbrev_regex.search(city_to_compare) and city_to_compare.split(
-                                    ' %s' % state_abbrev.lower())[-1] == '':
-                result_components[6] = titlecase(state_abbrev.join(
-                        city_to_compare.split(' %s' % state_abbrev)[:-1]
-                    ))
-                result_components[7] = KNOWN_STATE_ABBREVS[state_abbrev]
+        state_abbrev_match = STATE_ABBREV_RE.search(city_to_compare)
+        if state_abbrev_match:
+            result_components[6] = cached_titlecase(
+                    state_abbrev_match.group('rest')
+                )
+            result_components[7] = KNOWN_STATE_ABBREVS[
+                    state_abbrev_match.group('abbrev')
+                ]
 
     # Alternately, if the value for street name ends in a known state
     # abbreviation and there's no state, normalize the state to its USPS code
@@ -283,51 +669,43 @@ def normalize_address(address, db_alias=None, additional_street_styles=None):
     if result_components[6] == '' and result_components[7] == '':
         street_to_compare = result_components[2].strip().replace(',',
                 '').replace('.', '').lower()
-        for state_abbrev in KNOWN_STATE_ABBREVS.keys():
-            if ' %s' % state_abbrev in street_to_compare and \
-                    street_to_compare.split(' %s' % state_abbrev)[-1] == '':
-                new_state = KNOWN_STATE_ABBREVS[state_abbrev]
-                revised_address = " ".join([
-                        format_for_geocoder(result_components).lower().split(
-                                                    ' %s' % state_abbrev)[0],
-                        new_state
-                    ])
-                # RECURSION RECURSION RECURSION: Call normalize_address
-                # function for the revised address. Note that if the
-                # USPS-abbreviated value for the selected key in
-                # known_state_abbrevs isn't among the states PostGIS knows of
-                # this will cause infinite recursion. Which is bad.)
-                result_components = normalize_address(
-                        revised_address,
-                        db_alias
-                    )
-                result_components[2] = titlecase(result_components[2])
-                result_components[6] = titlecase(result_components[6])
+        state_abbrev_match = STATE_ABBREV_RE.search(street_to_compare)
+        if state_abbrev_match:
+            state_abbrev = state_abbrev_match.group('abbrev')
+            new_state = KNOWN_STATE_ABBREVS[state_abbrev]
+            revised_address = " ".join([
+                    format_for_geocoder(result_components).lower().split(
+                                                ' %s' % state_abbrev)[0],
+                    new_state
+                ])
+            # RECURSION RECURSION RECURSION: Call normalize_address
+            # function for the revised address. Note that if the
+            # USPS-abbreviated value for the selected key in
+            # known_state_abbrevs isn't among the states PostGIS knows of
+            # this will cause infinite recursion. Which is bad.)
+            result_components = normalize_address(
+                    revised_address,
+                    db_alias
+                )
+            result_components[2] = cached_titlecase(result_components[2])
+            result_components[6] = cached_titlecase(result_components[6])
 
     # Now check to see if this address is on a state, federal or interstate
     # highway. If it is, it may not have been recognized by the geocoder and
     # may be listed as part of the street name (not the stret type). If so,
     # fix the address components.
     if result_components[3] == '':
-        highway_regex = re.compile(r'%s' % "|".join([
-                '^%s(\d+|\w+)' % item
-                    for item in HIGHWAYS_TO_GEOCODER.keys()
-            ]))
         # First see if the address begins with one of our non-standard highway
         # types. If so, split into road number/letter and road type based on
         # the matching key.
-        highway_match = highway_regex.search(result_components[2].lower())
+        highway_match = HIGHWAY_RE.search(result_components[2].lower())
         if highway_match:
-            highway_keys_regex = re.compile(r'%s' % "|".join([
-                    '^%s' % item for item in HIGHWAYS_TO_GEOCODER.keys()
-                ]))
-            highway_key_match = highway_keys_regex.search(highway_match.string)
             result_components[3] = HIGHWAYS_TO_GEOCODER[
-                    highway_key_match.group().lower()
+                    highway_match.group('highway')
                 ]
-            result_components[2] = highway_match.string[
-                    highway_key_match.end():highway_match.end()
-                ].strip().upper()
+            result_components[2] = highway_match.group(
+                    'number'
+                ).strip().upper()
             # Now see if a post-direction was specified. If so split this off
             # and place it in the correct position in the components list.
             if len(highway_match.string) > highway_match.end():
@@ -337,20 +715,17 @@ def normalize_address(address, db_alias=None, additional_street_styles=None):
             # Finally, check if the city was mistakenly placed into the
             # postdirectional position and correct this as needed.
             if result_components[4] != '' and result_components[6] == '':
-                directions_re = re.compile(r'%s' % "|".join([
-                    '^%s' % item for item in DIRECTION_LOOKUPS.keys()
-                    ]))
-                direction_search = directions_re.search(result_components[4])
+                direction_search = DIRECTIONS_RE.search(result_components[4])
                 if direction_search and \
                         len(direction_search.string) > direction_search.end():
-                    result_components[6] = titlecase(result_components[4][
-                            direction_search.end():
-                        ]).strip()
+                    result_components[6] = cached_titlecase(
+                            result_components[4][direction_search.end():]
+                        ).strip()
                     result_components[4] = result_components[4][
                             :direction_search.end()
                         ].upper().strip()
                 elif not direction_search:
-                    result_components[6] = titlecase(
+                    result_components[6] = cached_titlecase(
                             result_components[4]
                         ).strip()
                     result_components[4] = ''
@@ -0,0 +1,383 @@
+# Imports from python.
+from collections import OrderedDict
+from hashlib import md5
+import threading
+import time
+
+
+# Imports from django.
+from django.conf import settings
+try:
+    from django.core.cache import caches
+except ImportError:
+    # Django before 1.7.
+    from django.core.cache import get_cache
+    caches = None
+
+
+class LRUCache(object):
+    """
+    A class that describes a thread-safe, in-process cache that evicts
+    its least recently used entries once it's full, and expires entries
+    a set time after they were stored.
+
+    Has the following components:
+        ~   max_size: the largest number of entries the cache will hold.
+        ~   ttl: the number of seconds an entry stays valid, or None if
+                entries never expire.
+        ~   hits: the number of lookups that found a valid entry.
+        ~   misses: the number of lookups that didn't.
+
+    Includes methods get(), set() and clear() to manage entries and
+    stats() to report on how well the cache is working.
+    """
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        """
+        Returns the value stored for a key (marking it as the most
+        recently used entry), or the given default if the key isn't in
+        the cache or has expired.
+        """
+        self.lock.acquire()
+        try:
+            entry = self.entries.pop(key, None)
+            if entry is None or (entry[0] is not None
+                                 and entry[0] < time.time()):
+                self.misses += 1
+                return default
+            self.entries[key] = entry
+            self.hits += 1
+            return entry[1]
+        finally:
+            self.lock.release()
+
+    def set(self, key, value):
+        """
+        Stores a value for a key, evicting the least recently used entry
+        if the cache is full.
+        """
+        expires = None
+        if self.ttl is not None:
+            expires = time.time() + self.ttl
+        self.lock.acquire()
+        try:
+            self.entries.pop(key, None)
+            self.entries[key] = (expires, value)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        """
+        Removes every entry from the cache and resets its counters.
+        """
+        self.lock.acquire()
+        try:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+        finally:
+            self.lock.release()
+
+    def stats(self):
+        """
+        Returns a dict with the cache's hit and miss counts, its current
+        size and its maximum size.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.entries),
+            'max_size': self.max_size,
+        }
+
+
+# The in-process caches, keyed by name, which are built the first time each
+# is needed.
+IN_PROCESS_CACHES = {}
+IN_PROCESS_CACHES_LOCK = threading.Lock()
+
+
+def get_in_process_cache(name, size_setting, default_size, ttl_setting,
+                         default_ttl):
+    """
+    Returns one of lieux's named in-process caches, creating it the
+    first time it's needed with the size and lifetime given by the
+    named settings (or the defaults, if those aren't set).
+
+    Returns a LRUCache object, or a value of None if the cache's size
+    has been set to 0 to turn it off.
+    """
+    if name not in IN_PROCESS_CACHES:
+        IN_PROCESS_CACHES_LOCK.acquire()
+        try:
+            if name not in IN_PROCESS_CACHES:
+                max_size = getattr(settings, size_setting, default_size)
+                IN_PROCESS_CACHES[name] = None
+                if max_size:
+                    IN_PROCESS_CACHES[name] = LRUCache(
+                            max_size,
+                            getattr(settings, ttl_setting, default_ttl)
+                        )
+        finally:
+            IN_PROCESS_CACHES_LOCK.release()
+    return IN_PROCESS_CACHES[name]
+
+
+def get_normalization_cache():
+    """
+    Returns the in-process cache of normalize_address() results, creating
+    it the first time it's needed. Its size and lifetime are set by the
+    GEOCODER_NORMALIZATION_CACHE_SIZE (defaults to 1,024 entries; set it
+    to 0 to turn the cache off) and GEOCODER_NORMALIZATION_CACHE_TTL
+    (defaults to one hour) settings.
+
+    Returns a LRUCache object, or a value of None if the cache is turned
+    off.
+    """
+    return get_in_process_cache(
+            'normalization',
+            'GEOCODER_NORMALIZATION_CACHE_SIZE',
+            1024,
+            'GEOCODER_NORMALIZATION_CACHE_TTL',
+            3600
+        )
+
+
+def clear_normalization_cache():
+    """
+    Empties the normalization cache (for instance, after the geocoder's
+    TIGER data has been reloaded).
+    """
+    cache = get_normalization_cache()
+    if cache is not None:
+        cache.clear()
+
+
+def get_titlecase_cache():
+    """
+    Returns the in-process cache of title-cased street and city names,
+    creating it the first time it's needed. Its size is set by the
+    GEOCODER_TITLECASE_CACHE_SIZE setting (defaults to 4,096 entries;
+    set it to 0 to turn the cache off). Title-casing never changes, so
+    entries don't expire.
+
+    Returns a LRUCache object, or a value of None if the cache is turned
+    off.
+    """
+    return get_in_process_cache(
+            'titlecase',
+            'GEOCODER_TITLECASE_CACHE_SIZE',
+            4096,
+            'GEOCODER_TITLECASE_CACHE_TTL',
+            None
+        )
+
+
+# The Django caches results are shared through, keyed by cache alias (on
+# versions of Django without django.core.cache.caches).
+RESULT_CACHES = {}
+
+
+def get_result_cache():
+    """
+    Returns the Django cache that geocoding results are shared through,
+    as named by the GEOCODER_RESULT_CACHE setting (a key in your
+    CACHES setting). Any of Django's cache backends can be used.
+
+    Returns a Django cache object, or a value of None if no result
+    cache has been configured.
+    """
+    cache_alias = getattr(settings, 'GEOCODER_RESULT_CACHE', None)
+    if not cache_alias:
+        return None
+    # Django's caches handler keeps one backend instance per thread.
+    if caches is not None:
+        return caches[cache_alias]
+    # Older versions' get_cache() builds a new backend instance on every
+    # call, so keep the one we build for each alias.
+    if cache_alias not in RESULT_CACHES:
+        RESULT_CACHES[cache_alias] = get_cache(cache_alias)
+    return RESULT_CACHES[cache_alias]
+
+
+# Where the state falls in the normalized query each kind of lookup is keyed
+# on (see canonicalize_query).
+QUERY_STATE_POSITIONS = {
+    'address': 7,
+    'intersection': 3,
+}
+
+
+def canonicalize_query(query, state_position=None):
+    """
+    Lowercases a query and collapses its whitespace, so trivially
+    different spellings of a query share cache entries. The query can
+    be a string or a list of normalized address components (in which
+    case every spelling that normalizes the same way shares an entry).
+
+    Takes one required and one optional argument:
+        *   query: the query to be canonicalized.
+        -   state_position: the position of the state among a list of
+                components, which is replaced by the state's USPS
+                abbreviation (so 'Wisconsin', 'Wis.' and 'WI' are all
+                keyed as 'wi'). Defaults to None.
+
+    Returns a string representing the canonical query.
+    """
+    if isinstance(query, (list, tuple)):
+        parts = list(query)
+        if state_position is not None and len(parts) > state_position:
+            # Imports from lieux.
+            from lieux.lookups import lookup_state
+            state = lookup_state(parts[state_position])
+            if state:
+                parts[state_position] = state.postal
+        return "|".join(" ".join(part.lower().split()) for part in parts)
+    return " ".join(query.lower().split())
+
+
+# The layout of cached result objects. Bump it whenever GeocodedAddress or
+# GeocodedIntersection change shape, so results pickled by an older version of
+# lieux are never loaded into the new classes.
+RESULT_CACHE_FORMAT = 2
+
+
+def result_cache_key(kind, query, max_results, db_alias):
+    """
+    Given the kind of lookup ('address', 'intersection' or 'search'),
+    the query and the lookup's other arguments, builds the key its
+    results are cached under. The query is canonicalized first (see
+    canonicalize_query, with the state at its place in QUERY_STATE_POSITIONS
+    for this kind of lookup), and the whole key is hashed so it's safe
+    for any cache backend.
+
+    The key also includes the GEOCODER_DATA_VERSION setting (the vintage
+    of the geocoder's TIGER data), so results cached before the data was
+    reloaded are never served afterward, and likewise the
+    RESULT_CACHE_FORMAT of the cached objects.
+    """
+    canonical_query = canonicalize_query(
+            query,
+            QUERY_STATE_POSITIONS.get(kind)
+        )
+    data_version = getattr(settings, 'GEOCODER_DATA_VERSION', '')
+    return 'lieux:%s:%s:%s' % (
+            RESULT_CACHE_FORMAT,
+            kind,
+            md5(repr(
+                    (canonical_query, max_results, db_alias, data_version)
+                ).encode('utf-8')).hexdigest()
+        )
+
+
+def get_cached_results(kind, query, max_results, db_alias):
+    """
+    Looks up a lookup's results in the result cache.
+
+    Returns the cached list of lieux.objects.GeocodedAddress or
+    lieux.objects.GeocodedIntersection objects, or a value of None if
+    there is no result cache or the results aren't in it.
+    """
+    cache = get_result_cache()
+    if cache is None:
+        return None
+    return cache.get(result_cache_key(kind, query, max_results, db_alias))
+
+
+def get_many_cached_results(kind, queries, max_results, db_alias):
+    """
+    Looks up the results of several lookups of the same kind in the
+    result cache, in a single call to the cache.
+
+    Returns a dict mapping the position of each query found in the cache
+    to its cached results.
+    """
+    cache = get_result_cache()
+    if cache is None or not queries:
+        return {}
+    keys = [
+        result_cache_key(kind, query, max_results, db_alias)
+        for query in queries
+    ]
+    cached = cache.get_many(keys)
+    return dict(
+        (position, cached[key]) for position, key in enumerate(keys)
+        if key in cached
+    )
+
+
+def cache_results(kind, query, max_results, db_alias, results):
+    """
+    Stores a lookup's results in the result cache (if there is one) for
+    GEOCODER_RESULT_CACHE_TIMEOUT seconds (defaults to one day).
+    """
+    cache = get_result_cache()
+    if cache is None:
+        return
+    cache.set(
+            result_cache_key(kind, query, max_results, db_alias),
+            results,
+            getattr(settings, 'GEOCODER_RESULT_CACHE_TIMEOUT', 86400)
+        )
+
+
+def get_negative_cache():
+    """
+    Returns the in-process cache of lookups known to have failed,
+    creating it the first time it's needed. Its size and lifetime are
+    set by the GEOCODER_NEGATIVE_CACHE_SIZE (defaults to 1,024 entries;
+    set it to 0 to turn the cache off) and GEOCODER_NEGATIVE_CACHE_TTL
+    (defaults to one minute) settings.
+
+    Returns a LRUCache object, or a value of None if the cache is turned
+    off.
+    """
+    return get_in_process_cache(
+            'negative',
+            'GEOCODER_NEGATIVE_CACHE_SIZE',
+            1024,
+            'GEOCODER_NEGATIVE_CACHE_TTL',
+            60
+        )
+
+
+def raise_cached_failure(kind, query, db_alias):
+    """
+    Given the kind of lookup, its query string and database alias,
+    re-raises the exception the same lookup raised the last time it was
+    tried, if that failure is still in the negative cache. Otherwise
+    does nothing.
+    """
+    cache = get_negative_cache()
+    if cache is None:
+        return
+    failure = cache.get((kind, canonicalize_query(query), db_alias))
+    if failure is not None:
+        raise failure[0](failure[1])
+
+
+def cache_failure(kind, query, db_alias, error):
+    """
+    Given the kind of lookup, its query string and database alias and
+    the lieux exception it raised, remembers that failure in the
+    negative cache (if there is one).
+    """
+    cache = get_negative_cache()
+    if cache is None:
+        return
+    cache.set(
+            (kind, canonicalize_query(query), db_alias),
+            (error.__class__, error.parameter)
+        )
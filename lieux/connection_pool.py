@@ -0,0 +1,243 @@
+# Imports from python.
+from contextlib import contextmanager
+import threading
+import time
+
+
+# Imports from django.
+from django.conf import settings
+from django.db import connections
+from django.db.utils import load_backend
+
+
+# Imports from lieux.
+from lieux.exceptions import ConnectionPoolExhaustedError
+
+
+# The connection pools this process has created, keyed by database alias.
+CONNECTION_POOLS = {}
+CONNECTION_POOLS_LOCK = threading.Lock()
+
+
+class GeocoderConnectionPool(object):
+    """
+    A class that keeps a bounded pool of persistent connections to the
+    geocoder's database, so each query can skip connection setup and
+    reuse whatever the connection has already prepared or warmed up.
+
+    Has the following components:
+        ~   db_alias: the name given to the geocoder's database in your
+                settings.py file.
+        ~   size: the maximum number of connections the pool will open.
+        ~   timeout: the number of seconds to wait for a connection to
+                become free when all of them are in use.
+        ~   health_check_interval: the number of seconds a connection
+                can sit idle before it's tested with a query on its
+                next checkout.
+        ~   session_settings: a dict of PostgreSQL run-time settings
+                (such as search_path) applied once to each new
+                connection.
+
+    Includes methods acquire() and release() to check connections in
+    and out, connection() to do both around a block of code and
+    close_all() to shut every idle connection.
+    """
+    def __init__(self, db_alias, size, timeout=30,
+                 health_check_interval=30, session_settings=None):
+        self.db_alias = db_alias
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.session_settings = session_settings or {}
+        self.idle = []
+        self.opened = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Checks a connection out of the pool, opening a new one if none
+        are idle and the pool isn't full yet. Raises a
+        ConnectionPoolExhaustedError if none is free within the pool's
+        timeout.
+        """
+        deadline = time.time() + self.timeout
+        self.condition.acquire()
+        try:
+            while True:
+                # Prefer the most recently used idle connection.
+                while self.idle:
+                    connection, last_used = self.idle.pop()
+                    if self.is_healthy(connection, last_used):
+                        return connection
+                    self.discard(connection)
+                if self.opened < self.size:
+                    self.opened += 1
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise ConnectionPoolExhaustedError(
+                            "No geocoder connection became free within "
+                            "%s seconds." % self.timeout
+                        )
+                self.condition.wait(remaining)
+        finally:
+            self.condition.release()
+
+        # Open the new connection outside of the lock.
+        try:
+            return self.open_connection()
+        except Exception:
+            self.condition.acquire()
+            self.opened -= 1
+            self.condition.notify()
+            self.condition.release()
+            raise
+
+    def release(self, connection, broken=False):
+        """
+        Returns a connection to the pool (or closes it, if it's broken).
+        """
+        self.condition.acquire()
+        try:
+            if broken:
+                self.discard(connection)
+            else:
+                self.idle.append((connection, time.time()))
+            self.condition.notify()
+        finally:
+            self.condition.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Checks a connection out of the pool for the duration of a with
+        block. If the block raises an exception the connection is
+        closed rather than being reused.
+        """
+        connection = self.acquire()
+        try:
+            yield connection
+        except Exception:
+            self.release(connection, broken=True)
+            raise
+        self.release(connection)
+
+    def close_all(self):
+        """
+        Closes every idle connection in the pool.
+        """
+        self.condition.acquire()
+        try:
+            while self.idle:
+                self.discard(self.idle.pop()[0])
+        finally:
+            self.condition.release()
+
+    def open_connection(self):
+        """
+        Opens a new connection to the geocoder's database, in autocommit
+        mode and with the pool's session settings applied.
+        """
+        # Copy the settings from Django's own connection to this database,
+        # which (unlike the DATABASES setting itself) have had Django's
+        # defaults for any missing keys (such as CONN_MAX_AGE) filled in.
+        settings_dict = dict(connections[self.db_alias].settings_dict)
+        backend = load_backend(settings_dict['ENGINE'])
+        try:
+            connection = backend.DatabaseWrapper(
+                    settings_dict,
+                    self.db_alias,
+                    allow_thread_sharing=True
+                )
+        except TypeError:
+            # Newer versions of Django count the threads sharing a connection
+            # instead of taking a flag.
+            connection = backend.DatabaseWrapper(settings_dict, self.db_alias)
+            connection.inc_thread_sharing()
+        cursor = connection.cursor()
+
+        # The pooled connections live outside of any request, so don't let
+        # them sit idle in an open transaction.
+        if hasattr(connection, 'set_autocommit'):
+            connection.set_autocommit(True)
+        else:
+            connection.connection.autocommit = True
+
+        for name, value in self.session_settings.items():
+            cursor.execute('SELECT set_config(%s, %s, false)', [name, value])
+
+        return connection
+
+    def is_healthy(self, connection, last_used):
+        """
+        Checks that an idle connection is still open. Connections that
+        have been idle for longer than the health check interval are
+        also tested with a trivial query.
+        """
+        if connection.connection is None or connection.connection.closed:
+            return False
+        if time.time() - last_used < self.health_check_interval:
+            return True
+        try:
+            connection.cursor().execute('SELECT 1')
+        except Exception:
+            return False
+        return True
+
+    def discard(self, connection):
+        """
+        Closes a connection and frees its place in the pool. Must be
+        called with the pool's lock held.
+        """
+        self.opened -= 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def get_connection_pool(db_alias):
+    """
+    Given a database alias, returns the connection pool for that
+    database, creating it the first time it's needed. Pooling is turned
+    on by setting GEOCODER_POOL_SIZE to the maximum number of
+    connections to keep.
+
+    Takes one required argument:
+        *   db_alias: the name given to the geocoder's database in your
+                settings.py file.
+
+    Returns a GeocoderConnectionPool object, or a value of None if
+    pooling is turned off.
+    """
+    pool_size = getattr(settings, 'GEOCODER_POOL_SIZE', 0)
+    if not pool_size:
+        return None
+
+    if db_alias not in CONNECTION_POOLS:
+        CONNECTION_POOLS_LOCK.acquire()
+        try:
+            if db_alias not in CONNECTION_POOLS:
+                CONNECTION_POOLS[db_alias] = GeocoderConnectionPool(
+                        db_alias,
+                        pool_size,
+                        timeout=getattr(
+                                settings,
+                                'GEOCODER_POOL_TIMEOUT',
+                                30
+                            ),
+                        health_check_interval=getattr(
+                                settings,
+                                'GEOCODER_POOL_HEALTH_CHECK_INTERVAL',
+                                30
+                            ),
+                        session_settings=getattr(
+                                settings,
+                                'GEOCODER_SESSION_SETTINGS',
+                                None
+                            )
+                    )
+        finally:
+            CONNECTION_POOLS_LOCK.release()
+
+    return CONNECTION_POOLS[db_alias]
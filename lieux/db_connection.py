@@ -1,6 +1,57 @@
+# Imports from python.
+from contextlib import contextmanager
+from hashlib import md5
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+import re
+import threading
+
+
 # Imports from django.
 from django.conf import settings
-from django.db import connections
+from django.db import DatabaseError, connections
+
+
+# Imports from lieux.
+from lieux.connection_pool import get_connection_pool
+
+
+@contextmanager
+def geocoder_connection(db_alias):
+    """
+    Provides a connection to the geocoder's database for the duration
+    of a with block. If GEOCODER_POOL_SIZE is set the connection is
+    checked out of lieux's connection pool; otherwise it's Django's own
+    connection for this thread, with GEOCODER_SESSION_SETTINGS applied
+    the first time it's used.
+
+    Takes one required argument:
+        *   db_alias: the name given to the geocoder's database in your
+                settings.py file.
+    """
+    pool = get_connection_pool(db_alias)
+    if pool:
+        with pool.connection() as connection:
+            yield connection
+    else:
+        connection = connections[db_alias]
+        cursor = connection.cursor()
+        if getattr(connection, '_lieux_configured_connection', None) \
+                is not connection.connection:
+            session_settings = getattr(
+                    settings,
+                    'GEOCODER_SESSION_SETTINGS',
+                    None
+                ) or {}
+            for name, value in session_settings.items():
+                cursor.execute(
+                        'SELECT set_config(%s, %s, false)',
+                        [name, value]
+                    )
+            connection._lieux_configured_connection = connection.connection
+        yield connection
 
 
 def submit_geocoder_query(query, db_alias=None):
@@ -29,15 +80,430 @@ def submit_geocoder_query(query, db_alias=None):
                 'geocoder'
             )
 
-    # First, build the cursor that will connect us to the database.
-    cursor = connections[db_alias].cursor()
+    # Connect to the database, then submit the query and get all resulting
+    # rows.
+    with geocoder_connection(db_alias) as connection:
+        cursor = connection.cursor()
+        cursor.execute(query)
+        result = cursor.fetchall()
+
+    # If there were no results, return a value of None. Otherwise, send back
+    # the results.
+    if result == []:
+        return None
+    return result
+
+
+# A registry of the query shapes lieux sends to the geocoder, keyed by name.
+# Each value is a tuple of the statement's parameter types, its SQL (with
+# parameters written as $1, $2, etc.), the signatures of any lieux functions
+# it calls and the same SQL as a plain parameterized query (see
+# build_unprepared_query).
+GEOCODER_STATEMENTS = {}
+
+# Matches a statement's numbered parameters ($1, $2, etc.).
+STATEMENT_PARAMETER_RE = re.compile(r'\$(\d+)')
+
+# A registry of the server-side functions lieux installs in the geocoder's
+# database, keyed by signature (e.g. 'my_function(text,integer)'). Each value
+# is a tuple of the CREATE statement for that function and its version (see
+# register_geocoder_function).
+GEOCODER_FUNCTIONS = {}
+
+# The (db_alias, signature) pairs this process has confirmed are installed at
+# their current version.
+INSTALLED_GEOCODER_FUNCTIONS = set()
+
+# The key of the advisory lock held while installing those functions (an
+# arbitrary number, which just spells out "lieu").
+GEOCODER_FUNCTIONS_LOCK_ID = 0x6c696575
+
+
+def register_geocoder_statement(name, parameter_types, query, requires=None):
+    """
+    Adds a query shape to the registry of statements that can be run
+    with submit_prepared_query().
+
+    Takes three required and one optional argument:
+        *   name: a unique name for this statement.
+        *   parameter_types: a list of the PostgreSQL types of each of
+                the statement's parameters, in order.
+        *   query: the statement's SQL, with its parameters written as
+                $1, $2, etc.
+        -   requires: a list of the signatures of registered geocoder
+                functions this statement calls. Defaults to None.
+    """
+    GEOCODER_STATEMENTS[name] = (
+        parameter_types,
+        query,
+        requires or [],
+        build_unprepared_query(parameter_types, query)
+    )
+
+
+def build_unprepared_query(parameter_types, query):
+    """
+    Rewrites a statement's SQL as a plain parameterized query, for
+    connections that won't live long enough to make preparing it worth
+    the extra round trip. Each numbered parameter becomes a placeholder
+    cast to the parameter's type.
+
+    Returns a tuple of the rewritten SQL and a list of the (zero-based)
+    position of the parameter behind each placeholder, in order, since
+    a statement can use the same parameter more than once.
+    """
+    positions = []
+
+    def substitute(match):
+        position = int(match.group(1)) - 1
+        positions.append(position)
+        return '%%s::%s' % parameter_types[position]
+
+    return (
+        STATEMENT_PARAMETER_RE.sub(substitute, query.replace('%', '%%')),
+        positions
+    )
+
+
+def register_geocoder_function(signature, definition):
+    """
+    Adds a server-side function to the registry of functions lieux
+    installs in the geocoder's database.
+
+    Takes two required arguments:
+        *   signature: the function's name and argument types, as
+                PostgreSQL would print them (e.g. 'f(text,integer)').
+        *   definition: the CREATE OR REPLACE FUNCTION statement that
+                installs it.
+
+    The function's version is a hash of its definition, so changing the
+    definition is enough to have it re-installed everywhere.
+    """
+    GEOCODER_FUNCTIONS[signature] = (
+        definition,
+        'lieux:%s' % md5(definition.encode('utf-8')).hexdigest()
+    )
+
+
+def install_geocoder_functions(signatures=None, db_alias=None):
+    """
+    Installs registered server-side functions in the geocoder's
+    database, skipping any that are already there at their current
+    version. Functions are installed automatically the first time a
+    statement needs them, but this can also be called when deploying.
+
+    Takes two optional arguments:
+        -   signatures: a list of the signatures of the functions to
+                install. Defaults to None, which installs them all.
+        -   db_alias: the name given to the geocoder's database in your
+                settings.py file. Defaults to None (though a null value
+                will be overridden in lines 205-210).
+    """
+    # Unless otherwise specified, the database alias will be that which has
+    # been specified in settings.GEOCODER_DB_ALIAS (or, failing that, the
+    # string 'geocoder').
+    if not db_alias:
+        db_alias = getattr(
+                settings,
+                'GEOCODER_DB_ALIAS',
+                'geocoder'
+            )
+
+    if signatures is None:
+        signatures = GEOCODER_FUNCTIONS.keys()
+
+    with geocoder_connection(db_alias) as connection:
+        ensure_geocoder_functions(connection, signatures, db_alias)
+
+
+def ensure_geocoder_functions(connection, signatures, db_alias):
+    """
+    Given an open connection to the geocoder's database, installs any
+    of the given registered functions that aren't there yet, or that
+    were installed from an older definition. Each installed function is
+    labeled with its version in a comment, which is checked once per
+    process.
+    """
+    cursor = connection.cursor()
+    for signature in signatures:
+        if (db_alias, signature) in INSTALLED_GEOCODER_FUNCTIONS:
+            continue
+        if get_geocoder_function_version(cursor, signature) != \
+                GEOCODER_FUNCTIONS[signature][1]:
+            replace_geocoder_function(cursor, signature)
+        INSTALLED_GEOCODER_FUNCTIONS.add((db_alias, signature))
+
+
+def get_geocoder_function_version(cursor, signature):
+    """
+    Returns the version a function was last installed at (or None, if
+    it isn't installed, or wasn't installed by lieux).
+    """
+    cursor.execute(
+            "SELECT obj_description(to_regprocedure(%s), 'pg_proc')",
+            [signature]
+        )
+    return cursor.fetchone()[0]
+
+
+def replace_geocoder_function(cursor, signature):
+    """
+    Installs the current definition of a registered function. This is
+    done in a single transaction, holding an advisory lock so that
+    processes starting up at the same time install it one at a time
+    (the rest find it already at this version once they get the lock),
+    and so that no query ever sees the function missing.
+    """
+    definition, version = GEOCODER_FUNCTIONS[signature]
+    cursor.execute('BEGIN')
+    try:
+        cursor.execute(
+                'SELECT pg_advisory_xact_lock(%s)',
+                [GEOCODER_FUNCTIONS_LOCK_ID]
+            )
+        if get_geocoder_function_version(cursor, signature) != version:
+            cursor.execute('SAVEPOINT lieux_replace_function')
+            try:
+                cursor.execute(definition)
+            except DatabaseError:
+                # CREATE OR REPLACE can't change the type of rows a function
+                # returns, so only then is the old version dropped first. (If
+                # the definition fails for some other reason it'll just fail
+                # again, and the drop is rolled back along with everything
+                # else.)
+                cursor.execute('ROLLBACK TO SAVEPOINT lieux_replace_function')
+                cursor.execute('DROP FUNCTION IF EXISTS %s' % signature)
+                cursor.execute(definition)
+            cursor.execute(
+                    'COMMENT ON FUNCTION %s IS %%s' % signature,
+                    [version]
+                )
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+    cursor.execute('COMMIT')
+
+
+def get_prepared_statements(connection):
+    """
+    Given a Django database connection (either Django's own or one of
+    lieux's pooled connections), returns the set of statement names
+    that have already been prepared on it. The set is tied to the
+    underlying database connection, so it starts out empty again
+    whenever Django reconnects.
+    """
+    prepared = getattr(connection, '_lieux_prepared_statements', None)
+    if not prepared or prepared[0] is not connection.connection:
+        prepared = (connection.connection, set())
+        connection._lieux_prepared_statements = prepared
+    return prepared[1]
+
+
+def uses_persistent_connections(db_alias):
+    """
+    Given a database alias, checks whether lieux's connections to it
+    outlive a single request: either they're pooled (GEOCODER_POOL_SIZE)
+    or Django keeps them open (a CONN_MAX_AGE of None or more than 0).
+    """
+    if get_connection_pool(db_alias):
+        return True
+    max_age = connections[db_alias].settings_dict.get('CONN_MAX_AGE', 0)
+    return max_age is None or max_age > 0
+
+
+def submit_prepared_query(name, params, db_alias=None):
+    """
+    Given the name of a registered statement and the values to bind to
+    its parameters, runs that statement on the geocoder's database and
+    returns all results. On persistent connections (see
+    uses_persistent_connections) each statement is prepared (and so
+    parsed and planned) only once per connection. Connections that are
+    closed after every request would have to prepare it again each time,
+    costing a round trip, so there it's sent as a plain parameterized
+    query instead.
+
+    Takes two required and one optional argument:
+        *   name: the name the statement was registered under.
+        *   params: a list of the values for the statement's parameters.
+        -   db_alias: the name given to the geocoder's database in your
+                settings.py file. Defaults to None (though a null value
+                will be overridden in lines 339-344).
+
+    Returns a list of tuples representing each line of results and its
+    respective columns, if there are results generated. Otherwise
+    returns a value of None.
+    """
+    # Unless otherwise specified, the database alias will be that which has
+    # been specified in settings.GEOCODER_DB_ALIAS (or, failing that, the
+    # string 'geocoder').
+    if not db_alias:
+        db_alias = getattr(
+                settings,
+                'GEOCODER_DB_ALIAS',
+                'geocoder'
+            )
+
+    parameter_types, query, requires, unprepared = GEOCODER_STATEMENTS[name]
+
+    with geocoder_connection(db_alias) as connection:
+        cursor = connection.cursor()
+
+        # Make sure any functions the statement calls have been installed.
+        ensure_geocoder_functions(connection, requires, db_alias)
 
-    # Then submit the query and get all resulting rows.
-    cursor.execute(query)
-    result = cursor.fetchall()
+        if uses_persistent_connections(db_alias):
+            # Prepare the statement if this connection hasn't seen it yet.
+            prepared = get_prepared_statements(connection)
+            if name not in prepared:
+                cursor.execute('PREPARE lieux_%s (%s) AS %s' % (
+                        name,
+                        ', '.join(parameter_types),
+                        query
+                    ))
+                prepared.add(name)
+
+            # Then execute it with the given values bound to its parameters.
+            cursor.execute(
+                    'EXECUTE lieux_%s (%s)' % (
+                            name,
+                            ', '.join(['%s'] * len(params))
+                        ),
+                    params
+                )
+        else:
+            unprepared_query, positions = unprepared
+            cursor.execute(
+                    unprepared_query,
+                    [params[position] for position in positions]
+                )
+
+        # Either way, get all resulting rows.
+        result = cursor.fetchall()
 
     # If there were no results, return a value of None. Otherwise, send back
     # the results.
     if result == []:
         return None
     return result
+
+
+class GeocoderQueryWorkers(object):
+    """
+    A class that keeps a fixed set of long-lived threads for running
+    geocoder queries side by side, so concurrent lookups don't start
+    (and tear down) threads of their own on every call.
+
+    Has the following components:
+        ~   size: the number of worker threads.
+        ~   tasks: the queue of calls waiting for a free worker.
+
+    Includes method run() to run a list of calls and wait for them all.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.tasks = queue.Queue()
+        for position in range(size):
+            thread = threading.Thread(target=self.work)
+            thread.daemon = True
+            thread.start()
+
+    def work(self):
+        while True:
+            function, args, finished = self.tasks.get()
+            try:
+                function(*args)
+            finally:
+                finished.set()
+
+    def run(self, calls):
+        """
+        Given a list of (function, args) tuples, runs each call on one of
+        the workers and waits until all of them have finished.
+        """
+        finished_events = []
+        for function, args in calls:
+            finished = threading.Event()
+            self.tasks.put((function, args, finished))
+            finished_events.append(finished)
+        for finished in finished_events:
+            finished.wait()
+
+
+# The worker threads, which are started the first time they're needed.
+QUERY_WORKERS = None
+QUERY_WORKERS_LOCK = threading.Lock()
+
+
+def get_query_workers():
+    """
+    Returns the shared GeocoderQueryWorkers object, starting one worker
+    for each connection GEOCODER_POOL_SIZE allows (so the workers can
+    never exhaust the pool) the first time it's needed.
+    """
+    global QUERY_WORKERS
+    if QUERY_WORKERS is None:
+        QUERY_WORKERS_LOCK.acquire()
+        try:
+            if QUERY_WORKERS is None:
+                QUERY_WORKERS = GeocoderQueryWorkers(
+                        getattr(settings, 'GEOCODER_POOL_SIZE', 0)
+                    )
+        finally:
+            QUERY_WORKERS_LOCK.release()
+    return QUERY_WORKERS
+
+
+def submit_prepared_queries_concurrently(queries, db_alias=None):
+    """
+    Given a list of registered statements to run, runs them at the same
+    time on lieux's query workers (and so each on its own pooled
+    connection to the geocoder's database) and returns all of their
+    results. Running queries side by side needs the connection pool
+    (GEOCODER_POOL_SIZE); without it, the queries are simply run one
+    after another on this thread's connection.
+
+    Takes one required and one optional argument:
+        *   queries: a list of (name, params) tuples, each describing a
+                call to submit_prepared_query().
+        -   db_alias: the name given to the geocoder's database in your
+                settings.py file. Defaults to None (though a null value
+                will be overridden in lines 479-484).
+
+    Returns a list holding the results of each query, in the order the
+    queries were given. If any of the queries raised an exception, the
+    first such exception is re-raised once all have finished.
+    """
+    # Unless otherwise specified, the database alias will be that which has
+    # been specified in settings.GEOCODER_DB_ALIAS (or, failing that, the
+    # string 'geocoder').
+    if not db_alias:
+        db_alias = getattr(
+                settings,
+                'GEOCODER_DB_ALIAS',
+                'geocoder'
+            )
+
+    if not get_connection_pool(db_alias):
+        return [
+            submit_prepared_query(name, params, db_alias)
+            for name, params in queries
+        ]
+
+    results = [None] * len(queries)
+    errors = [None] * len(queries)
+
+    def run_query(position, name, params):
+        try:
+            results[position] = submit_prepared_query(name, params, db_alias)
+        except Exception as error:
+            errors[position] = error
+
+    get_query_workers().run([
+        (run_query, (position, name, params))
+        for position, (name, params) in enumerate(queries)
+    ])
+
+    for error in errors:
+        if error is not None:
+            raise error
+    return results
@@ -42,3 +42,10 @@ class NoResultsError(BaseGeocoderException):
     Raised when the search() function fails to generate any results.
     """
     pass
+
+
+class ConnectionPoolExhaustedError(BaseGeocoderException):
+    """
+    Raised when no pooled geocoder connection becomes free in time.
+    """
+    pass
@@ -1,76 +1,13 @@
-# Imports from python.
-import re
-
-
 # Imports fron django.
 from django.conf import settings
 
 
 # Imports from lieux.
-from lieux import ap_style
 from lieux.address import normalize_address
-from lieux.latstatestyle import CROSSWALK
-from lieux.secondary_units import SECONDARY_UNITS_WITH_NUMBERS
-from lieux.street_suffixes import street_suffixes
-from lieux.style import HIGHWAYS_STATE_APPEND, HIGHWAYS_TO_STYLE
-
-
-# Imports from other dependencies.
-from titlecase import titlecase
-
-
-def format_for_styler(components):
-    """
-    A simple function that joins all address components together with
-    spaces in preparation for sending to the styler function.
-
-    Takes one required argument:
-        *   address_list: a list of strings representing the components
-            of this address.
-
-    Returns a string representing the joined values.
-    """
-    # Ignore the last component in the list; it will be a 't' indicating the
-    # geocoder generated this result.
-    components_to_geocode = components[:-1]
-
-    # Also ignore the fifth element in the list as it's the apartment number,
-    # if one was given.
-    line_1_components = []
-
-    if components_to_geocode[0] != '':
-        line_1_components.append(components_to_geocode[0])
-
-    if components_to_geocode[3].lower() in HIGHWAYS_TO_STYLE.keys() \
-            and components_to_geocode[2].strip('"') != '':
-        if components_to_geocode[1].strip('"') != '':
-            line_1_components.append(components_to_geocode[1].strip('"'))
-        line_1_components.append(components_to_geocode[3].strip('"'))
-        line_1_components.append(components_to_geocode[2].strip('"'))
-        if components_to_geocode[4].strip('"') != '':
-            line_1_components.append(components_to_geocode[4].strip('"'))
-    else:
-        line_1_components = [cpnt.strip('"') for cpnt \
-                in components_to_geocode[:5] if cpnt != '']
-    line_1 = " ".join(cpnt.strip('"') for cpnt in line_1_components)
-
-    address_line = None
-    if components_to_geocode[5] != '':
-        address_line = components_to_geocode[5].replace('"', '').strip()
-
-    line_2_components = [cpnt.strip('"') for cpnt in components_to_geocode[6:] \
-                                        if cpnt != '']
-
-    # If there is a city name specified, make sure it's in titlecase.
-    if components_to_geocode[6] != '':
-        line_2_components[0] = '"%s"' % titlecase(line_2_components[0].lower())
-
-    line_2 = " ".join(line_2_components)
-
-    if address_line:
-        return " ".join([line_1, address_line, line_2])
-
-    return " ".join([line_1, line_2])
+from lieux.lookups import cached_titlecase, lookup, lookup_state, \
+    normalize_token
+from lieux.objects import AddressComponents
+from lieux.parser import format_grid_number, parse_grid_number
 
 
 def format_result_in_ap_style(address, db_alias=None, street_custom_styles=None, additional_street_styles=None):
@@ -113,26 +50,9 @@ def format_result_in_ap_style(address, db_alias=None, street_custom_styles=None,
     # Remove all periods and commas from the address.
     address = address.replace(',', '').replace('.', '')
 
-    # If the first part of the address matches the bizarre out-state
-    # Wisconsin address formula (exempli gratia, N109W1711 Ava Circle),
-    # remove that address and substitute in a bogus number instead.
-    # We'll format the actual address and substitute it in later.
-    address_first_part = address.split(' ')[0]
-    address_first_part_match = re.search(
-        r'([N|E|W|S])(\d+)([N|E|W|S])(\d+)',
-        address_first_part.upper(),
-        flags=re.IGNORECASE
-    )
-    if address_first_part_match:
-        address_first_part_formatted = "%s%s-%s%s" % (
-            address_first_part_match.group(1).upper(),
-            address_first_part_match.group(2),
-            address_first_part_match.group(3).upper(),
-            address_first_part_match.group(4)
-        )
-        address = '171717' + address.split(address_first_part)[1]
-
-    # First, normalize this address using PostGIS.
+    # First, normalize this address using PostGIS. (Out-state Wisconsin grid
+    # numbers, as in N109W1711 Ava Circle, are carried through normalization
+    # as the address number.)
     result_list = normalize_address(
             address,
             db_alias,
@@ -142,117 +62,138 @@ def format_result_in_ap_style(address, db_alias=None, street_custom_styles=None,
     if not result_list:
         return None
 
-    if address_first_part_match:
-        if result_list[0] == '171717':
-            result_list[0] = address_first_part_formatted
+    # If there were non-numeric characters in the street address, replace
+    # their normalized value with the raw street number.
+    address_first_part = address.split(' ')[0]
+    if result_list[0] != '' and not address_first_part.isdigit() \
+            and not parse_grid_number(address_first_part):
+        result_list[0] = address_first_part.strip(' ').upper()
+
+    return format_components_in_ap_style(
+            result_list,
+            street_custom_styles
+        )
+
+
+def format_components_in_ap_style(components, street_custom_styles=None):
+    """
+    Given already-normalized address components (an AddressComponents
+    object, or a list in the same order as PostGIS' (addy) object),
+    converts that address to Associated Press style without consulting
+    the database.
+
+    Takes one required and one optional argument:
+        *   components: an AddressComponents object (or a list of
+                strings) representing the components of this address.
+        -   street_custom_styles: A dict of dicts, with first-level
+                keys specifying a city and second-level keys specifying
+                the names of streets in this city that should be changed
+                before they are returned from the formatter. The second-
+                level keys will be replaced with the respective values.
+                Optional, and defaults to None.
+
+    Returns a list of strings representing each line of the address
+    converted to follow style.
+    """
+    # Wrap plain lists of components, so they can be read by name.
+    if not isinstance(components, AddressComponents):
+        components = AddressComponents(components)
 
     formatted_address = []
     formatted_first_line = []
-    # For our additional processing, check if there were non-numeric characters
-    # in the street address. If so, replace their normalized value with the raw
-    # street number. Else use the normalized value.
-
-    if result_list[0] != '':
-        if not address.split(' ')[0].isdigit():
-            formatted_first_line.append(
-                        address.split(' ')[0].strip(' ').upper()
-                    )
-        else:
-            formatted_first_line.append(result_list[0])
+
+    # Look the street type up once; it decides how both the street name and
+    # the type itself are styled.
+    street_type = lookup(normalize_token(components.street_type))
+
+    if components.number != '':
+        formatted_first_line.append(
+                format_grid_number(components.number) or
+                components.number.upper()
+            )
 
     # Now check to see if the street has a predirection. If so convert its
     # value to Associated Press style.
-    if result_list[1] != '':
-        formatted_first_line.append(ap_style.PREDIRECTIONS_TO_AP_STYLE[
-            result_list[1].lower()].upper())
+    if components.predirection != '':
+        predirection = lookup(normalize_token(components.predirection))
+        formatted_first_line.append(
+                (predirection.direction_ap or components.predirection).upper()
+            )
 
-    # Now remove any quotes that may have been added to the street name, and
-    # see if it matches one of the streets for which we have a custom style. If
-    # so, return this custom street name in lieu of the one from the geocoder.
-    # Else return the geocoded result in titlecase.
+    # Now see if the street name matches one of the streets for which we have
+    # a custom style. If so, return this custom street name in lieu of the one
+    # from the geocoder. Else return the geocoded result in titlecase.
 
-    if result_list[2] != '' and result_list[3].lower() not \
-                in HIGHWAYS_TO_STYLE.keys():
+    if components.street != '' and not street_type.highway:
         if street_custom_styles:
-            if result_list[6].lower() in street_custom_styles.keys() and \
-                    result_list[2].strip('"').lower() in street_custom_styles[
-                            result_list[6].lower()
+            if components.city.lower() in street_custom_styles.keys() and \
+                    components.street.lower() in street_custom_styles[
+                            components.city.lower()
                         ].keys():
                 formatted_first_line.append(
                         street_custom_styles[
-                            result_list[6].lower()
-                        ][result_list[2].strip('"').lower()])
+                            components.city.lower()
+                        ][components.street.lower()])
             else:
-                formatted_first_line.append(titlecase(
-                    result_list[2].strip('"')
+                formatted_first_line.append(cached_titlecase(
+                    components.street
                 ))
         else:
-            formatted_first_line.append(titlecase(
-                result_list[2].strip('"')
+            formatted_first_line.append(cached_titlecase(
+                components.street
             ))
 
     # Next match roads to their corrrect abbreviations (or non-abbreviations)
     # according to Associated Press style.
     formatted_highway = None
-    if result_list[3] != '':
-        if result_list[3].lower() in street_suffixes.keys() and \
-                        street_suffixes[result_list[3].lower()] \
-                        in ap_style.SUFFIXES_TO_AP_STYLE.keys():
-            formatted_first_line.append(
-                    ap_style.SUFFIXES_TO_AP_STYLE[
-                            street_suffixes[result_list[3].lower()]
-                        ].capitalize()
-                )
-        elif result_list[3].lower() in HIGHWAYS_TO_STYLE.keys():
-            if result_list[3].lower() in HIGHWAYS_STATE_APPEND:
-                if result_list[2] != '':
+    if components.street_type != '':
+        if street_type.suffix_ap:
+            formatted_first_line.append(street_type.suffix_ap.capitalize())
+        elif street_type.highway:
+            if street_type.highway_state_append:
+                if components.street != '':
                     formatted_first_line.append("%s%s" % (
                             "%(state_full)s %(hwy_fmt)s",
-                            result_list[2].strip('"').upper()
+                            components.street.upper()
                         ))
-                    formatted_highway = " ".join(HIGHWAYS_TO_STYLE[
-                            result_list[3].lower()
-                        ].split(' ')[1:])
+                    formatted_highway = " ".join(
+                            street_type.highway.split(' ')[1:]
+                        )
                 else:
                     formatted_first_line.append("%(state_full)s %(hwy_fmt)s")
-                    formatted_highway = HIGHWAYS_TO_STYLE[
-                            result_list[3].lower()
-                        ]
+                    formatted_highway = street_type.highway
             else:
-                if result_list[2] != '':
+                if components.street != '':
                     formatted_first_line.append('%s%s' % (
-                            HIGHWAYS_TO_STYLE[result_list[3].lower()],
-                            result_list[2].strip('"').upper()
+                            street_type.highway,
+                            components.street.upper()
                         ))
                 else:
-                    formatted_first_line.append(
-                            HIGHWAYS_TO_STYLE[result_list[3].lower()]
-                        )
+                    formatted_first_line.append(street_type.highway)
 
     # Now append the post-directional suffix, if one exists. Not sure about the
     # style guidelines on this, so I'll defer doing anything too fancy until I
     # know for sure. ~AJV
-    if result_list[4] != '':
-        formatted_first_line.append(result_list[4])
+    if components.postdirection != '':
+        formatted_first_line.append(components.postdirection)
 
     # Now append the entire first line of the address to an array of the whole
     # address by line.
     formatted_address.append(" ".join(item for item in formatted_first_line))
 
     # Next process the unit number (if one was given).
-    if result_list[5] != '':
-        unit_raw = result_list[5]
+    if components.unit != '':
+        unit_raw = components.unit
         unit_kind = unit_raw.split(' ')[0].lower()
-        if unit_kind.replace('.', '') in SECONDARY_UNITS_WITH_NUMBERS.keys():
-            unit_type = SECONDARY_UNITS_WITH_NUMBERS[unit_kind.replace('.',
-                    '')]
+        unit_type = lookup(normalize_token(unit_kind)).unit
+        if unit_type:
             unit_remainder = unit_raw[len(unit_kind):].upper()
             if unit_remainder[1:4] == '000':
                 unit_remainder = ' %s' % unit_remainder[4:]
             #
-            if len(result_list[5].split(' ')) == 2 and \
-                    result_list[5].split(' ')[0].upper() == \
-                    result_list[5].split(' ')[1].upper():
+            if len(components.unit.split(' ')) == 2 and \
+                    components.unit.split(' ')[0].upper() == \
+                    components.unit.split(' ')[1].upper():
                 unit_formatted = [
                     unit_type.capitalize(),
                     ' unit'
@@ -273,24 +214,26 @@ def format_result_in_ap_style(address, db_alias=None, street_custom_styles=None,
     # If the address has a city name listed, check if it's listed as a style
     # exception to the normal rules. If so return it in the local style; if not
     # capitalize each word of it and return that.
-    if result_list[6] != '':
-        formatted_city_state_line.append(titlecase(result_list[6]) + ",")
+    if components.city != '':
+        formatted_city_state_line.append(
+                cached_titlecase(components.city) + ","
+            )
 
     # If the address has a state listed, look for it first in the abbreviations
     # to state names in Associated Press style crosswalk. If the abbreviation
     # is not there, uppercase it as given and return it instead.
-    if result_list[7] != '':
-        if result_list[7].lower() in CROSSWALK.keys():
-            state_match = CROSSWALK[result_list[7]]
-            formatted_city_state_line.append(state_match['ap'])
-            state_full = state_match['name']
+    if components.state != '':
+        state_match = lookup_state(components.state)
+        if state_match:
+            formatted_city_state_line.append(state_match.ap)
+            state_full = state_match.name
         else:
-            formatted_city_state_line.append(result_list[7].upper())
-            state_full = result_list[7].upper()
+            formatted_city_state_line.append(components.state.upper())
+            state_full = components.state.upper()
 
     # If the address has a ZIP code, add that to the formatted line.
-    if result_list[8] != '':
-        formatted_city_state_line.append(result_list[8])
+    if components.zip != '':
+        formatted_city_state_line.append(components.zip)
 
     # Concatenate the last line of the address and append it to the
     # formatted_address array.
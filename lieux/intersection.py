@@ -7,11 +7,17 @@ from django.conf import settings
 
 
 # Imports from lieux.
-from lieux.address import normalize_address
-from lieux.db_connection import submit_geocoder_query
+from lieux.address import normalize_addresses, select_addy_fields, \
+    unpack_addy_fields
+from lieux.cache import cache_failure, cache_results, get_cached_results, \
+    raise_cached_failure
+from lieux.connection_pool import get_connection_pool
+from lieux.db_connection import register_geocoder_function, \
+    register_geocoder_statement, submit_prepared_queries_concurrently, \
+    submit_prepared_query
 from lieux.exceptions import IntersectionInputError, IntersectionNotFoundError
+from lieux.lookups import lookup_state
 from lieux.objects import GeocodedAddress, GeocodedIntersection
-from lieux.us_states import US_STATES
 
 
 # Build the necessary regexes.
@@ -20,6 +26,70 @@ SOMETIMES_DENOTES_INTERSECTION_RE = re.compile(
     r'\s+AND\s+|\s+AT\s+|\s*&\s*|\s*/\s*')
 
 
+# Register the server-side function that runs the intersection fallback
+# tiers. If we have both a city and a ZIP code, it tries the query with both.
+# If we don't, or if that query fails, it tries with just the city (if we have
+# it). Failing that, it tries with just a ZIP code, and as a last resort it
+# uses just the state (which will take the longest to proces and has the
+# highest likelihood of yielding bunk results). For the first tier to match,
+# it returns the forward results (street one at street two, in the order the
+# user entered it) and then, if both_directions is true, the reverse ones
+# (street two at street one).
+register_geocoder_function(
+        'lieux_geocode_intersection(text,text,text,text,text,integer,boolean)',
+        """
+CREATE OR REPLACE FUNCTION lieux_geocode_intersection(
+        first_road text, second_road text, in_state text, in_city text,
+        in_zip text, num_results integer, both_directions boolean)
+    RETURNS TABLE(tier integer, is_reverse boolean, rating integer,
+        lat double precision, lng double precision, addy norm_addy) AS $$
+#variable_conflict use_column
+DECLARE
+    this_tier record;
+BEGIN
+    FOR this_tier IN
+        SELECT t.tier, t.city, t.zip FROM (VALUES
+            (1, in_city, in_zip, in_city <> '' AND in_zip <> ''),
+            (2, in_city, '', in_city <> ''),
+            (3, '', in_zip, in_zip <> ''),
+            (4, '', '', true)
+        ) AS t(tier, city, zip, applies)
+        WHERE t.applies ORDER BY t.tier
+    LOOP
+        RETURN QUERY SELECT this_tier.tier, false, g.rating,
+            ST_Y(g.geomout), ST_X(g.geomout), g.addy
+            FROM geocode_intersection(first_road, second_road, in_state,
+                this_tier.city, this_tier.zip, num_results) AS g;
+        IF FOUND THEN
+            IF NOT both_directions THEN
+                RETURN;
+            END IF;
+            RETURN QUERY SELECT this_tier.tier, true, g.rating,
+                ST_Y(g.geomout), ST_X(g.geomout), g.addy
+                FROM geocode_intersection(second_road, first_road, in_state,
+                    this_tier.city, this_tier.zip, num_results) AS g;
+            RETURN;
+        END IF;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+"""
+    )
+
+# Register the statements this module sends to the geocoder.
+register_geocoder_statement(
+        'geocode_intersection',
+        ['text', 'text', 'text', 'text', 'text', 'integer', 'boolean'],
+        "SELECT g.tier, g.is_reverse, g.rating, g.lat, g.lng, %s"
+        " FROM lieux_geocode_intersection($1, $2, $3, $4, $5, $6, $7) AS g"
+        % select_addy_fields('g.addy'),
+        requires=[
+            'lieux_geocode_intersection(text,text,text,text,text,integer,'
+            'boolean)'
+        ]
+    )
+
+
 def geocode_intersection(intersection_raw, max_results=10, db_alias=None):
     """
     Given a string representing the intersection of two streets,
@@ -50,131 +120,100 @@ def geocode_intersection(intersection_raw, max_results=10, db_alias=None):
                 'geocoder'
             )
 
+    # If this intersection failed to geocode recently, fail the same way
+    # again without going to the database.
+    raise_cached_failure('intersection', intersection_raw, db_alias)
+
     # First, normalize the intersection.
-    intersection_dict = normalize_intersection(
-            intersection_raw,
+    try:
+        intersection_dict = normalize_intersection(
+                intersection_raw,
+                db_alias
+            )
+    except IntersectionInputError as error:
+        cache_failure('intersection', intersection_raw, db_alias, error)
+        raise
+
+    # If results for this normalized intersection have already been cached,
+    # return them. Keying on the normalized streets and location means every
+    # spelling of the same intersection shares one cached result.
+    normalized_intersection = [
+        intersection_dict['first_road'],
+        intersection_dict['second_road'],
+        intersection_dict['city'] or '',
+        intersection_dict['state'] or '',
+        intersection_dict['zip'] or ''
+    ]
+    cached_results = get_cached_results(
+            'intersection',
+            normalized_intersection,
+            max_results,
             db_alias
         )
+    if cached_results is not None:
+        return cached_results
 
-    # Build and execute the query.
     query_args = [
-        "'%s'" % intersection_dict['first_road'],
-        "'%s'" % intersection_dict['second_road'],
-        "'%s'" % intersection_dict['state']
+        intersection_dict['first_road'],
+        intersection_dict['second_road'],
+        intersection_dict['state']
     ]
     reverse_query_args = [
-        "'%s'" % intersection_dict['second_road'],
-        "'%s'" % intersection_dict['first_road'],
-        "'%s'" % intersection_dict['state']
+        intersection_dict['second_road'],
+        intersection_dict['first_road'],
+        intersection_dict['state']
+    ]
+    tier_args = [
+        intersection_dict['city'] or '',
+        intersection_dict['zip'] or '',
+        max_results * 5
     ]
 
-    geocoding_query = "SELECT g.rating, ST_Y(g.geomout), ST_X(g.geomout), " \
-                    "addy FROM geocode_intersection(%(query_string)s) AS g;"
-
-    # If we have both a city and a ZIP code, try and run the query with both.
-    # If we don't, or if that query fails, try with just the city (if we have
-    # it). Failing that, try with just a ZIP code, and as a last resort try
-    # using just the state (which will take the longest to proces and has the
-    # highest likelihood of yielding bunk results).
-    intersection_result = None
-    if intersection_dict['city'] and intersection_dict['zip']:
-        this_query = []
-        this_query.append("'%s'" % intersection_dict['city'])
-        this_query.append("'%s'" % intersection_dict['zip'])
-        this_query.append(str(max_results * 5))
-        # Run the forward query (street one at street two, in the order the
-        # user entered it).
-        intersection_result = submit_geocoder_query(
-                geocoding_query % dict(
-                        query_string=", ".join(query_args + this_query)
-                    ),
-                db_alias
-            )
-        # Then run the backward query (street two at street one, in the reverse
-        # order from how the user entered it).
-        cross_street_intersection = submit_geocoder_query(
-                geocoding_query % dict(
-                        query_string=", ".join(reverse_query_args + this_query)
-                    ),
-                db_alias
-            )
-
-    if intersection_dict['city'] and not intersection_result:
-        this_query = []
-        this_query.append("'%s'" % intersection_dict['city'])
-        this_query.append("''")
-        this_query.append(str(max_results * 5))
-        # Run the forward query (street one at street two, in the order the
-        # user entered it).
-        intersection_result = submit_geocoder_query(
-                geocoding_query % dict(
-                        query_string=", ".join(query_args + this_query)
-                    ),
-                db_alias
-            )
-
-        # Then run the backward query (street two at street one, in the reverse
-        # order from how the user entered it).
-        cross_street_intersection = submit_geocoder_query(
-                geocoding_query % dict(
-                        query_string=", ".join(reverse_query_args + this_query)
-                    ),
-                db_alias
-            )
-
-    if intersection_dict['zip'] and not intersection_result:
-        this_query = []
-        this_query.append("''")
-        this_query.append("'%s'" % intersection_dict['zip'])
-        this_query.append(str(max_results * 5))
-        # Run the forward query (street one at street two, in the order the
-        # user entered it).
-        intersection_result = submit_geocoder_query(
-                geocoding_query % dict(
-                        query_string=", ".join(query_args + this_query)
-                    ),
-                db_alias
-            )
-        # Then run the backward query (street two at street one, in the reverse
-        # order from how the user entered it).
-        cross_street_intersection = submit_geocoder_query(
-                geocoding_query % dict(
-                        query_string=", ".join(reverse_query_args + this_query)
-                    ),
-                db_alias
-            )
-
-    if not intersection_result:
-        this_query = []
-        this_query.append("''")
-        this_query.append("''")
-        this_query.append(str(max_results * 5))
-        # Run the forward query (street one at street two, in the order the
-        # user entered it).
-        intersection_result = submit_geocoder_query(
-                geocoding_query % dict(
-                        query_string=", ".join(query_args + this_query)
-                    ),
-                db_alias
-            )
-        # Then run the backward query (street two at street one, in the reverse
-        # order from how the user entered it).
-        cross_street_intersection = submit_geocoder_query(
-                geocoding_query % dict(
-                        query_string=", ".join([
-                                query_args[1],
-                                query_args[0],
-                                query_args[2]
-                            ] + this_query)
-                    ),
+    # Each row comes back as its tier and direction followed by the columns
+    # for a GeocodedAddress.
+    if getattr(settings, 'GEOCODER_CONCURRENT_INTERSECTIONS', False) \
+            and get_connection_pool(db_alias):
+        # Run the forward and reverse queries at the same time, each on its own
+        # pooled connection and each through the fallback tiers. The reverse
+        # query can't know which tier the forward one settled on, so drop any
+        # reverse results from another tier, just as the single query would.
+        intersection_result, cross_street_intersection = \
+            submit_prepared_queries_concurrently([
+                    ('geocode_intersection',
+                            query_args + tier_args + [False]),
+                    ('geocode_intersection',
+                            reverse_query_args + tier_args + [False]),
+                ], db_alias)
+        intersection_result = intersection_result or []
+        tier = None
+        if intersection_result:
+            tier = intersection_result[0][0]
+        cross_street_intersection = [
+            row[2:] for row in cross_street_intersection or []
+            if row[0] == tier
+        ]
+        intersection_result = [row[2:] for row in intersection_result]
+    else:
+        # Run every fallback tier in both directions (see
+        # lieux_geocode_intersection above) in a single query, and then split
+        # the rows by direction.
+        query_results = submit_prepared_query(
+                'geocode_intersection',
+                query_args + tier_args + [True],
                 db_alias
-            )
+            ) or []
+        intersection_result = [row[2:] for row in query_results if not row[1]]
+        cross_street_intersection = [
+            row[2:] for row in query_results if row[1]
+        ]
 
     # If the geocoder couldn't find the intersection, throw an exception.
     if not intersection_result:
-        raise IntersectionNotFoundError("No intersection of those streets " \
+        error = IntersectionNotFoundError("No intersection of those streets " \
             "was found for any combination of state and city and/or ZIP code "\
             "provided.")
+        cache_failure('intersection', intersection_raw, db_alias, error)
+        raise error
 
     # Otherwise, create several python objects -- one for each intersection
     # result returned, and one for the address tied to each result.
@@ -189,7 +228,7 @@ def geocode_intersection(intersection_raw, max_results=10, db_alias=None):
                 result[0],
                 result[1],
                 result[2],
-                result[3].strip('()').split(',')
+                unpack_addy_fields(result[3:])
             )
         # Create the 'comparator' dict, which we'll use to find near-duplicate
         # address results.
@@ -199,15 +238,13 @@ def geocode_intersection(intersection_raw, max_results=10, db_alias=None):
                     '%s,%s' % (result.lat, result.lng)
                 ] = [
                 " ".join(
-                        [cpnt for cpnt in result.components[1:5]
-                                if cpnt.replace('"', '') != '']
+                        [cpnt for cpnt in result.components[1:5] if cpnt != '']
                     )
                 ]
         # Now format this particular result's street in the same manner as the
         # comparator values above.
         address_street_formatted = " ".join([
-                cpnt for cpnt in address.components[1:5]
-                if cpnt.replace('"', '') != ''
+                cpnt for cpnt in address.components[1:5] if cpnt != ''
             ])
         # If the result's coordinates are a key in the comparator, see if their
         # value is on the same exact street (with directionals and type) as the
@@ -232,7 +269,7 @@ def geocode_intersection(intersection_raw, max_results=10, db_alias=None):
                     result[0],
                     result[1],
                     result[2],
-                    result[3].strip('()').split(',')
+                    unpack_addy_fields(result[3:])
                 )
             # Create the 'comparator' dict, which we'll use to find near-duplicate
             # address results.
@@ -240,7 +277,7 @@ def geocode_intersection(intersection_raw, max_results=10, db_alias=None):
                     '%s,%s' % (address.lat, address.lng)
                 ] = " ".join(
                         [cpnt for cpnt in address.components[1:5]
-                                if cpnt.replace('"', '') != '']
+                                if cpnt != '']
                     )
 
     # Finally, loop through all forward-query intersection results, matching
@@ -274,7 +311,15 @@ def geocode_intersection(intersection_raw, max_results=10, db_alias=None):
 
     # Return the first n results to the user, where n is the maximum number of
     # results we are to return.
-    return result_objects[:max_results]
+    result_objects = result_objects[:max_results]
+    cache_results(
+            'intersection',
+            normalized_intersection,
+            max_results,
+            db_alias,
+            result_objects
+        )
+    return result_objects
 
 
 def normalize_intersection(intersection_raw, db_alias=None):
@@ -334,8 +379,17 @@ def normalize_intersection(intersection_raw, db_alias=None):
             "1217",
             remainder
         ])
-    parsable = normalize_address(
-            spoofed_street_address,
+
+    # We'll normalize the first street name the same way, so send both to the
+    # normalizer at once.
+    spoofed_first = " ".join([
+            "1217",
+            first_road,
+            'Milwaukee',  # Note: it doesn't matter the city & state we use.
+            'WI'  # The function just needs something in these spots.
+        ])
+    parsable, first_road_parsable = normalize_addresses(
+            [spoofed_street_address, spoofed_first],
             db_alias
         )
 
@@ -349,11 +403,11 @@ def normalize_intersection(intersection_raw, db_alias=None):
         'zip': None
     }
     if parsable:
-        # Before processing the parsed result, remove all quotes from each
-        # address component.
-        parsable = [item.replace('"', '') for item in parsable]
-        if parsable[7] and parsable[7] in [item[0] for item in US_STATES]:
-            address_components['state'] = parsable[7]
+        state = None
+        if parsable[7]:
+            state = lookup_state(parsable[7])
+        if state and state.us_state:
+            address_components['state'] = state.postal
         else:
             address_components['state'] = getattr(
                         settings,
@@ -373,17 +427,7 @@ def normalize_intersection(intersection_raw, db_alias=None):
 
         second_road = " ".join([part for part in parsable[1:3] if part != ''])
 
-        # Now we'll go back and normalize the first street name the same way.
-        spoofed_first = " ".join([
-                "1217",
-                first_road,
-                'Milwaukee',  # Note: it doesn't matter the city & state we use.
-                'WI'  # The function just needs something in these spots.
-            ])
-        first_road_parsable = normalize_address(
-                spoofed_first,
-                db_alias
-            )
+        # Now we'll go back to the first street name's normalized value.
         if first_road_parsable:
             first_road = " ".join([part for part in first_road_parsable[1:3] \
                                     if part != ''])
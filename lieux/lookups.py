@@ -0,0 +1,316 @@
+# Imports from python.
+from collections import namedtuple
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import re
+import threading
+
+
+# Imports from lieux.
+from lieux.cache import get_titlecase_cache
+from lieux.style import CITY_NAMES_TO_STYLE, DIRECTION_LOOKUPS, \
+    HIGHWAYS_TO_GEOCODER, KNOWN_STATE_ABBREVS
+
+
+# Imports from other dependencies.
+from titlecase import titlecase
+
+
+# What the style tables say about a single token. Every field is None (or
+# False) unless the token belongs to that class of token.
+#   ~   suffix: the full street suffix name (street, avenue).
+#   ~   suffix_usps: the suffix's USPS abbreviation (St, Ave).
+#   ~   suffix_ap: the suffix in Associated Press style (st., ave.).
+#   ~   direction: the USPS direction abbreviation (W, NE).
+#   ~   direction_ap: the direction in Associated Press style (w., n.e.).
+#   ~   unit: the full name of a secondary unit type (apartment, rear).
+#   ~   unit_takes_number: whether that unit type is followed by a number.
+#   ~   state: the USPS state abbreviation (WI).
+#   ~   highway: the highway type in Associated Press style (U.S. Highway).
+#   ~   highway_state_append: whether the highway is named for its state
+#           (State Highway 32 becomes Wisconsin Highway 32).
+TokenLookup = namedtuple('TokenLookup', [
+        'suffix',
+        'suffix_usps',
+        'suffix_ap',
+        'direction',
+        'direction_ap',
+        'unit',
+        'unit_takes_number',
+        'state',
+        'highway',
+        'highway_state_append',
+    ])
+
+
+# The lookup for tokens that aren't in any of the tables.
+EMPTY_LOOKUP = TokenLookup(*([None] * len(TokenLookup._fields)))
+
+
+class FrozenIndex(Mapping):
+    """
+    A read-only mapping, so the shared lookup index can't be changed
+    once it's been built.
+    """
+    def __init__(self, entries):
+        self._entries = dict(entries)
+
+    def __getitem__(self, key):
+        return self._entries[key]
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        return self._entries.get(key, default)
+
+
+def normalize_token(value):
+    """
+    Given a token (or a run of tokens) from an address, returns the key
+    it's stored under in the lookup index: lowercased, without quotes or
+    periods and with its whitespace collapsed.
+    """
+    return " ".join(value.replace('"', '').replace('.', '').lower().split())
+
+
+def build_token_index():
+    """
+    Merges the suffix, direction, secondary unit, state and highway
+    tables into a single index of normalized tokens.
+
+    Returns a FrozenIndex mapping each token to a TokenLookup.
+    """
+    # Imports from lieux. These tables are only loaded once the index is
+    # first needed, rather than whenever lieux is imported.
+    from lieux.ap_style import PREDIRECTIONS_TO_AP_STYLE, \
+        SUFFIXES_TO_AP_STYLE
+    from lieux.secondary_units import SECONDARY_UNITS_WITH_NUMBERS, \
+        SECONDARY_UNITS_WITHOUT_NUMBERS
+    from lieux.street_suffixes import street_suffix_abbreviations, \
+        street_suffixes
+    from lieux.style import HIGHWAYS_STATE_APPEND, HIGHWAYS_TO_STYLE
+    from lieux.us_states import STATES_NORMALIZED
+
+    entries = {}
+
+    def add(token, **fields):
+        token = normalize_token(token)
+        entries.setdefault(token, {}).update(fields)
+
+    for variant, suffix in street_suffixes.items():
+        add(
+            variant,
+            suffix=suffix,
+            suffix_usps=street_suffix_abbreviations[suffix],
+            suffix_ap=SUFFIXES_TO_AP_STYLE.get(suffix)
+        )
+
+    for variant, direction in DIRECTION_LOOKUPS.items():
+        add(
+            variant,
+            direction=direction,
+            direction_ap=PREDIRECTIONS_TO_AP_STYLE.get(
+                    variant.lower(),
+                    PREDIRECTIONS_TO_AP_STYLE.get(direction.lower())
+                )
+        )
+
+    for variant, unit in SECONDARY_UNITS_WITH_NUMBERS.items():
+        add(
+            variant,
+            unit=unit,
+            unit_takes_number=variant not in SECONDARY_UNITS_WITHOUT_NUMBERS
+        )
+    for variant, unit in SECONDARY_UNITS_WITHOUT_NUMBERS.items():
+        add(variant, unit=unit, unit_takes_number=False)
+
+    for variant, state in STATES_NORMALIZED.items():
+        add(variant, state=state)
+    for variant, state in KNOWN_STATE_ABBREVS.items():
+        add(variant, state=state)
+
+    for variant, highway in HIGHWAYS_TO_STYLE.items():
+        add(
+            variant,
+            highway=highway,
+            highway_state_append=variant in HIGHWAYS_STATE_APPEND
+        )
+
+    return FrozenIndex(
+        (token, EMPTY_LOOKUP._replace(**fields))
+        for token, fields in entries.items()
+    )
+
+
+# The index itself, which is built the first time it's needed.
+TOKEN_INDEX = None
+TOKEN_INDEX_LOCK = threading.Lock()
+
+
+def get_token_index():
+    """
+    Returns the shared token index, building it the first time it's
+    needed.
+    """
+    global TOKEN_INDEX
+    if TOKEN_INDEX is None:
+        TOKEN_INDEX_LOCK.acquire()
+        try:
+            if TOKEN_INDEX is None:
+                TOKEN_INDEX = build_token_index()
+        finally:
+            TOKEN_INDEX_LOCK.release()
+    return TOKEN_INDEX
+
+
+def lookup(key):
+    """
+    Given a token (or a run of tokens) from an address, already
+    normalized with normalize_token, returns what the style tables say
+    about it, as a TokenLookup. Tokens that aren't in any table get
+    EMPTY_LOOKUP.
+    """
+    return get_token_index().get(key, EMPTY_LOOKUP)
+
+
+# Matchers for the style tables, built once at import. Each joins the table's
+# keys into a single alternation, longest first, so the most specific key
+# wins (US Hwy 41 rather than US, NORTHWEST rather than N) in one pass.
+HIGHWAY_RE = re.compile(r'^(?P<highway>%s)(?P<number>\d+|\w+)' % "|".join(
+        re.escape(key) for key in sorted(
+                HIGHWAYS_TO_GEOCODER.keys(),
+                key=len,
+                reverse=True
+            )
+    ))
+DIRECTIONS_RE = re.compile(r'^(?:%s)' % "|".join(
+        re.escape(key) for key in sorted(
+                DIRECTION_LOOKUPS.keys(),
+                key=len,
+                reverse=True
+            )
+    ))
+# Matches a value ending in one of the non-USPS state abbreviations (as in
+# Milwaukee Wis), capturing what comes before it and the abbreviation.
+STATE_ABBREV_RE = re.compile(r'^(?P<rest>.*) (?P<abbrev>%s)$' % "|".join(
+        re.escape(key.lower()) for key in sorted(
+                KNOWN_STATE_ABBREVS.keys(),
+                key=len,
+                reverse=True
+            )
+    ))
+
+
+# A state (or territory) and the ways lieux writes it.
+#   ~   postal: the USPS abbreviation (WI).
+#   ~   ap: the Associated Press abbreviation (Wis.).
+#   ~   name: the full name (Wisconsin).
+#   ~   fips: the FIPS code, as a string (55).
+#   ~   us_state: whether it's one of the 50 states or the District of
+#           Columbia, rather than a territory.
+StateRecord = namedtuple('StateRecord', [
+        'postal',
+        'ap',
+        'name',
+        'fips',
+        'us_state',
+    ])
+
+
+def build_state_index():
+    """
+    Merges the Associated Press crosswalk with lieux's own state
+    spellings into a single index, with one StateRecord per state shared
+    by every spelling, abbreviation and FIPS code of that state.
+
+    Returns a FrozenIndex mapping each normalized spelling to a
+    StateRecord.
+    """
+    # Imports from lieux.
+    from lieux.latstatestyle import CROSSWALK
+    from lieux.us_states import STATES_NORMALIZED, US_STATES
+
+    us_states = set(postal for postal, name in US_STATES)
+    records = {}
+    for state in CROSSWALK.values():
+        if state['postal'] not in records:
+            records[state['postal']] = StateRecord(
+                    state['postal'],
+                    state['ap'],
+                    state['name'],
+                    state['fips'],
+                    state['postal'] in us_states
+                )
+
+    entries = {}
+    for key, state in CROSSWALK.items():
+        entries[normalize_token(str(key))] = records[state['postal']]
+    for record in records.values():
+        entries[record.fips.zfill(2)] = record
+    for spelling, postal in STATES_NORMALIZED.items():
+        if postal in records:
+            entries.setdefault(normalize_token(spelling), records[postal])
+    for spelling, postal in KNOWN_STATE_ABBREVS.items():
+        entries.setdefault(normalize_token(spelling), records[postal])
+
+    return FrozenIndex(entries)
+
+
+# The state index, which is built the first time it's needed.
+STATE_INDEX = None
+STATE_INDEX_LOCK = threading.Lock()
+
+
+def lookup_state(value):
+    """
+    Given a state's name, USPS or Associated Press abbreviation, FIPS
+    code (as a string or integer) or one of its common misspellings, in
+    any case, returns that state's StateRecord.
+
+    Returns a value of None if the state isn't recognized.
+    """
+    global STATE_INDEX
+    if STATE_INDEX is None:
+        STATE_INDEX_LOCK.acquire()
+        try:
+            if STATE_INDEX is None:
+                STATE_INDEX = build_state_index()
+        finally:
+            STATE_INDEX_LOCK.release()
+    return STATE_INDEX.get(normalize_token(str(value)))
+
+
+def cached_titlecase(value):
+    """
+    A stand-in for titlecase() for street and city names, which repeat
+    endlessly. Cities in our coverage area are looked up in the
+    precomputed CITY_NAMES_TO_STYLE table; anything else is title-cased
+    once and then served from the titlecase cache (see
+    lieux.cache.get_titlecase_cache).
+
+    Takes one required argument:
+        *   value: the name to be title-cased.
+
+    Returns a string representing the title-cased name.
+    """
+    styled = CITY_NAMES_TO_STYLE.get(value.strip().lower())
+    if styled is not None:
+        return styled
+
+    cache = get_titlecase_cache()
+    if cache is None:
+        return titlecase(value)
+    styled = cache.get(value)
+    if styled is None:
+        styled = titlecase(value)
+        cache.set(value, styled)
+    return styled
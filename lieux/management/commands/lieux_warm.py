@@ -0,0 +1,149 @@
+# Imports from python.
+import codecs
+import threading
+import time
+
+
+# Imports from django.
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+# Imports from lieux.
+from lieux.cache import get_result_cache
+from lieux.search import search
+
+
+class Command(BaseCommand):
+    """
+    Reads a file of past geocoder queries (one per line) and runs each
+    through lieux.search.search(), so their results are sitting in the
+    result cache before the first real request for them comes in.
+    """
+    help = 'Fills the geocoder result cache from a file of past queries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'query_file',
+            help='A file of queries to warm, one per line.'
+        )
+        parser.add_argument(
+            '--concurrency',
+            action='store',
+            dest='concurrency',
+            type=int,
+            default=4,
+            help='The number of queries to run at once. Defaults to 4.'
+        )
+        parser.add_argument(
+            '--max-results',
+            action='store',
+            dest='max_results',
+            type=int,
+            default=10,
+            help='The max_results to warm each query with (it is part of ' \
+                    'the cache key). Defaults to 10.'
+        )
+        parser.add_argument(
+            '--database',
+            action='store',
+            dest='database',
+            default=None,
+            help='The geocoder database alias. Defaults to ' \
+                    'GEOCODER_DB_ALIAS.'
+        )
+
+    def handle(self, *args, **options):
+        if get_result_cache() is None:
+            raise CommandError('GEOCODER_RESULT_CACHE is not set, so there ' \
+                    'is no shared cache to warm.')
+
+        concurrency = max(options['concurrency'], 1)
+        max_results = options['max_results']
+        db_alias = options['database'] or getattr(
+                settings,
+                'GEOCODER_DB_ALIAS',
+                'geocoder'
+            )
+
+        # Read the queries, skipping blank lines and comments. Hot queries
+        # tend to repeat in logs, so only run each one once.
+        queries = []
+        seen = set()
+        query_file = codecs.open(options['query_file'], 'r', 'utf-8')
+        try:
+            for line in query_file:
+                query = line.strip()
+                if query and not query.startswith('#') and query not in seen:
+                    seen.add(query)
+                    queries.append(query)
+        finally:
+            query_file.close()
+
+        self.warmed = 0
+        self.failures = []
+        self.lock = threading.Lock()
+        remaining = list(reversed(queries))
+
+        def work():
+            try:
+                while True:
+                    self.lock.acquire()
+                    try:
+                        if not remaining:
+                            return
+                        query = remaining.pop()
+                    finally:
+                        self.lock.release()
+
+                    error = None
+                    try:
+                        search(
+                            query,
+                            max_results=max_results,
+                            db_alias=db_alias
+                        )
+                    except Exception as e:
+                        # Record lookups that found nothing (and database
+                        # errors and the like) rather than letting them kill
+                        # this worker.
+                        error = e
+
+                    self.lock.acquire()
+                    try:
+                        if error is None:
+                            self.warmed += 1
+                        else:
+                            self.failures.append((query, error))
+                    finally:
+                        self.lock.release()
+            finally:
+                # Each thread gets its own Django connection; don't leave it
+                # open once the thread is done.
+                connections[db_alias].close()
+
+        started = time.time()
+        threads = [
+            threading.Thread(target=work)
+            for i in range(min(concurrency, len(queries)))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - started
+
+        for query, error in self.failures:
+            self.stderr.write('Failed: %s (%s)\n' % (query, error))
+
+        self.stdout.write(
+                'Warmed %s of %s queries in %.1f seconds (%.1f queries per ' \
+                'second); %s failed.\n' % (
+                    self.warmed,
+                    len(queries),
+                    elapsed,
+                    len(queries) / elapsed if elapsed else 0,
+                    len(self.failures)
+                )
+            )
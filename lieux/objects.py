@@ -1,3 +1,95 @@
+class AddressComponents(object):
+    """
+    A class that describes the pieces of an address, in the same order
+    as PostGIS' (addy) object.
+
+    Has the following components:
+        ~   number: the address (house) number.
+        ~   predirection: the direction before the street name (W).
+        ~   street: the street's name.
+        ~   street_type: the street's type or suffix (St).
+        ~   postdirection: the direction after the street type.
+        ~   unit: the secondary unit (Apt 3), if there is one.
+        ~   city: the city (or other place) name.
+        ~   state: the state's abbreviation.
+        ~   zip: the ZIP code.
+        ~   parsed: whether the geocoder could parse the address ('t').
+
+    Components can also be read and set by position (components[6] is
+    the city), sliced, iterated over and compared, just like the list of
+    strings this class replaces.
+    """
+    __slots__ = (
+        'number',
+        'predirection',
+        'street',
+        'street_type',
+        'postdirection',
+        'unit',
+        'city',
+        'state',
+        'zip',
+        'parsed',
+    )
+
+    def __init__(self, components):
+        values = list(components)
+        values.extend([''] * (len(self.__slots__) - len(values)))
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return '<AddressComponents: %s>' % list(self)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [getattr(self, name) for name in self.__slots__[index]]
+        return getattr(self, self.__slots__[index])
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            names = self.__slots__[index]
+            value = list(value)
+            if len(value) != len(names):
+                raise ValueError(
+                        "Can't change the number of address components."
+                    )
+            for name, item in zip(names, value):
+                setattr(self, name, item)
+        else:
+            setattr(self, self.__slots__[index], value)
+
+    def __iter__(self):
+        for name in self.__slots__:
+            yield getattr(self, name)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __eq__(self, other):
+        if isinstance(other, (AddressComponents, list, tuple)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    # Components can be changed in place, so they can't be hashed.
+    __hash__ = None
+
+    # Objects with __slots__ have no __dict__ to pickle, so spell out their
+    # state for the result cache.
+    def __getstate__(self):
+        return tuple(self)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+
 class GeocodedAddress(object):
     """
     A class that describes a geocoded address.
@@ -7,19 +99,33 @@ class GeocodedAddress(object):
                 the user's query.
         ~   lat: the latitude of the address.
         ~   lng: the longitude of the address.
-        ~   components: the pieces of the address, represented as a list
-                with the same spacing as PostGIS' (addy) object.
+        ~   components: the pieces of the address, represented as an
+                AddressComponents object.
 
     Includes methods __init__(), __repr__() and __unicode__() for
     self-reference, format_in_ap_style(), render_coords(),
     render_one_line() and render_multi_line() for conversion to style
     and as_wkt() and coords() to enable quick formatting.
+
+    Formatted lines are cached on the instance, and are recomputed only
+    if the components have changed since they were last formatted.
     """
+    __slots__ = (
+        'rating',
+        'lat',
+        'lng',
+        'components',
+        '_ap_style_cache',
+    )
+
     def __init__(self, rating, lat, lng, components):
         self.rating = rating
         self.lat = lat
         self.lng = lng
+        if not isinstance(components, AddressComponents):
+            components = AddressComponents(components)
         self.components = components
+        self._ap_style_cache = None
 
     def __repr__(self):
         return '<Address: %s>' % self.__unicode__()
@@ -30,12 +136,26 @@ class GeocodedAddress(object):
                 self.render_coords()
             )
 
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
     def format_in_ap_style(self):
         # Imports from lieux
-        from lieux.formats import format_for_styler, format_result_in_ap_style
-        return format_result_in_ap_style(
-                format_for_styler(self.components)
-            )
+        from lieux.formats import format_components_in_ap_style
+        # Return the cached lines if the components haven't been changed
+        # (either replaced or edited in place) since they were formatted.
+        snapshot = tuple(self.components)
+        if self._ap_style_cache and self._ap_style_cache[0] == snapshot:
+            return list(self._ap_style_cache[1])
+        # The components are already normalized, so style them directly
+        # rather than sending them back through the geocoder's normalizer.
+        formatted = format_components_in_ap_style(self.components)
+        self._ap_style_cache = (snapshot, formatted)
+        return list(formatted)
 
     def render_coords(self):
         return "(%s, %s)" % (self.lat, self.lng)
@@ -78,12 +198,25 @@ class GeocodedIntersection(object):
     self-reference, format_in_ap_style(), render_one_line() and
     render_multi_line() for conversion to style and as_wkt() and
     coords() to enable quick formatting.
+
+    Formatted lines are cached on the instance, and are recomputed only
+    if either street or the address' components have changed since
+    they were last formatted.
     """
+    __slots__ = (
+        'rating',
+        'street_one',
+        'street_two',
+        'address',
+        '_ap_style_cache',
+    )
+
     def __init__(self, rating, street_one, street_two, address):
         self.rating = rating
         self.street_one = street_one
         self.street_two = street_two
         self.address = address
+        self._ap_style_cache = None
 
     def __repr__(self):
         return '<Intersection: %s>' % self.__unicode__()
@@ -94,14 +227,30 @@ class GeocodedIntersection(object):
                 self.address.render_coords()
             )
 
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
     def format_in_ap_style(self):
         # Imports from lieux
         from lieux.formats import format_result_in_ap_style
+        # Return the cached lines if neither street nor the address has been
+        # changed since they were formatted.
+        snapshot = (
+            self.street_one,
+            self.street_two,
+            tuple(self.address.components)
+        )
+        if self._ap_style_cache and self._ap_style_cache[0] == snapshot:
+            return list(self._ap_style_cache[1])
         first_street_formatted = format_result_in_ap_style(
                 '1217 %s, %s, %s' % (
                         self.street_one,
-                        self.address.components[6],
-                        self.address.components[7]
+                        self.address.components.city,
+                        self.address.components.state
                     )
             )
         fmt_string = [
@@ -111,14 +260,15 @@ class GeocodedIntersection(object):
                     format_result_in_ap_style(
                             '1217 %s, %s, %s' % (
                                     self.street_two,
-                                    self.address.components[6],
-                                    self.address.components[7]
+                                    self.address.components.city,
+                                    self.address.components.state
                                 )
                         )[0][5:]
                 ]),
             first_street_formatted[1]
         ]
-        return fmt_string
+        self._ap_style_cache = (snapshot, fmt_string)
+        return list(fmt_string)
 
     def render_one_line(self):
         return ", ".join([ln for ln in self.format_in_ap_style() if ln != ''])
@@ -0,0 +1,298 @@
+# Imports from python.
+import re
+
+
+# Imports from lieux.
+from lieux.lookups import HIGHWAY_RE, lookup, normalize_token
+from lieux.style import CITY_NAMES_TO_STYLE
+
+
+# Matches the out-state Wisconsin grid address formula (exempli gratia, the
+# N109W1711 in N109W1711 Ava Circle), with or without a hyphen between the
+# two halves.
+GRID_NUMBER_RE = re.compile(r'^([NEWS])(\d+)-?([NEWS])(\d+)$', re.IGNORECASE)
+
+
+def parse_grid_number(token):
+    """
+    Given the first token of an address, checks whether it's an
+    out-state Wisconsin grid number.
+
+    Returns a tuple of the grid number's four parts (exempli gratia,
+    ('N', '109', 'W', '1711')), or a value of None if the token isn't a
+    grid number.
+    """
+    match = GRID_NUMBER_RE.match(token.strip(',.'))
+    if not match:
+        return None
+    return (
+        match.group(1).upper(),
+        match.group(2),
+        match.group(3).upper(),
+        match.group(4)
+    )
+
+
+def format_grid_number(token):
+    """
+    Given a grid number in any of its spellings, returns it in Associated
+    Press style (N109-W1711), or a value of None if the token isn't a
+    grid number.
+    """
+    parts = parse_grid_number(token)
+    if not parts:
+        return None
+    return '%s%s-%s%s' % parts
+
+
+def split_grid_number(address):
+    """
+    Given a raw address, checks whether it begins with a grid number. If
+    so, swaps the grid number for a plain house number (its second half)
+    that the parser and PostGIS can make sense of.
+
+    Returns a tuple of the grid number in its normalized form (N109W1711)
+    and the address with the house number standing in, or of a value of
+    None and the unchanged address if there's no grid number.
+    """
+    tokens = address.strip().split(' ', 1)
+    parts = parse_grid_number(tokens[0])
+    if not parts:
+        return None, address
+    return "".join(parts), " ".join([parts[3]] + tokens[1:])
+
+
+def parse_address(address):
+    """
+    Given a raw address, tries to split it into its components in
+    Python rather than with PostGIS' normalize_address function. Only
+    plain addresses are parsed, in one of these forms:
+
+        NUMBER [DIR] NAME SUFFIX [DIR], CITY, STATE ZIP
+        NUMBER [DIR] NAME SUFFIX CITY STATE ZIP
+
+    (with the city, state and ZIP code each optional). Anything less
+    clear-cut -- unit numbers, highways, hyphenated or lettered house
+    numbers, street names that could be read more than one way, states
+    that could be part of the city -- is left to the database.
+
+    Takes one required argument:
+        *   address: the raw address to be parsed.
+
+    Returns a list of address components in the same order (and with
+    the same abbreviations) as the output of PostGIS' normalize_address
+    function, if the address could be parsed unambiguously. Otherwise
+    returns a value of None.
+    """
+    if '#' in address:
+        return None
+
+    parts = [part.split() for part in address.replace('.', '').split(',')]
+    parts = [part for part in parts if part]
+    if not parts or len(parts[0]) < 3:
+        return None
+
+    # Normalize and look up each token just once, keeping its normalized
+    # form for looking up runs of tokens later.
+    parts = [[
+        (token, lookup(key), key)
+        for token, key in [(token, normalize_token(token)) for token in part]
+    ] for part in parts]
+
+    # The address must begin with a plain house number.
+    number = parts[0][0][0]
+    if not number.isdigit():
+        return None
+
+    # If the address has commas, the street is everything before the first
+    # one. Otherwise it runs through the only street suffix in the address;
+    # if there's more than one suffix we can't know which ends the street.
+    if len(parts) > 1:
+        street = parts[0][1:]
+        location_parts = parts[1:]
+    else:
+        tokens = parts[0][1:]
+        suffix_positions = [
+            i for i, (token, token_lookup, key) in enumerate(tokens)
+            if token_lookup.suffix
+        ]
+        if len(suffix_positions) != 1:
+            return None
+        street = tokens[:suffix_positions[0] + 1]
+        location_parts = [tokens[suffix_positions[0] + 1:]]
+        # A direction after the suffix could be a post-direction or the start
+        # of a city name (State St West Allis).
+        if location_parts[0] and location_parts[0][0][1].direction:
+            return None
+        location_parts = [part for part in location_parts if part]
+
+    # Two-word directions (North West) are too easily confused with street
+    # names.
+    if lookup(" ".join(key for _, _, key in street[:2])).direction:
+        return None
+
+    predirection = ''
+    if street[0][1].direction:
+        # If the direction is all that comes before the suffix, it's the
+        # street's name (as in North Ave).
+        if len(street) < 3:
+            return None
+        predirection = street[0][1].direction
+        street = street[1:]
+
+    postdirection = ''
+    if len(street) > 2 and street[-1][1].direction and street[-2][1].suffix:
+        postdirection = street[-1][1].direction
+        street = street[:-1]
+
+    if len(street) < 2 or not street[-1][1].suffix:
+        return None
+    street_type = street[-1][1].suffix_usps
+    street_name = [token for token, _, _ in street[:-1]]
+
+    # Leave highways and unit numbers to the database.
+    if HIGHWAY_RE.search("%s " % " ".join(street_name).lower()):
+        return None
+    if [token for token, token_lookup, _ in street[:-1] + [
+            token for part in location_parts for token in part]
+            if token_lookup.unit]:
+        return None
+    location_parts = [
+        [(token, key) for token, _, key in part] for part in location_parts
+    ]
+
+    # Now take the ZIP code off the end of what's left.
+    zip_code = ''
+    if location_parts and location_parts[-1][-1][0].isdigit():
+        if len(location_parts[-1][-1][0]) != 5:
+            return None
+        zip_code = location_parts[-1][-1][0]
+        location_parts[-1] = location_parts[-1][:-1]
+        if not location_parts[-1]:
+            location_parts.pop()
+
+    # Then the state, which is only taken where it can't be part of the city:
+    # in a part of its own after the city (Milwaukee, WI), or after a city
+    # that doesn't make a known city name with it (Milwaukee WI, but not
+    # Port Washington). Anything else that looks like a state (Washington,
+    # Indiana) could just as well be the city, so leave it to the database.
+    state = ''
+    if len(location_parts) > 1 and lookup(
+            " ".join(key for _, key in location_parts[-1])).state:
+        state = lookup(
+                " ".join(key for _, key in location_parts.pop())
+            ).state
+    elif location_parts:
+        last_part = location_parts[-1]
+        last_keys = [key for _, key in last_part]
+        for length in (3, 2, 1):
+            if len(last_part) < length:
+                continue
+            state = lookup(" ".join(last_keys[-length:])).state
+            if state:
+                if len(location_parts) == 1 and len(last_part) == length:
+                    return None
+                if " ".join(last_keys) in CITY_NAMES_TO_STYLE:
+                    return None
+                location_parts[-1] = last_part[:-length]
+                break
+        state = state or ''
+    location = [token for part in location_parts for token, _ in part]
+
+    # Whatever remains is the city, which shouldn't include any numbers.
+    if [token for token in location if not token.replace('-', '').replace(
+            "'", '').isalpha()]:
+        return None
+
+    return [
+        str(int(number)),
+        predirection,
+        " ".join(street_name),
+        street_type,
+        postdirection,
+        '',
+        " ".join(location),
+        state,
+        zip_code,
+        't',
+    ]
+
+
+def split_secondary_unit(address):
+    """
+    Given a raw address, finds its secondary unit (an apartment, suite,
+    rear unit and so on) in a single pass over its words and takes it
+    out, so the rest of the address can be normalized on its own. Units
+    are recognized when they're marked with a '#' (#3, # 3, Apt #3), or
+    when a unit type that takes a number (Apt, Ste, Unit) comes after
+    the street name and is followed by a number or letter, or when a
+    unit type that doesn't (Rear, Upper) directly follows the street
+    suffix and ends the street (with a comma or the end of the address).
+    A unit's number is never taken from across a comma.
+
+    Takes one required argument:
+        *   address: the raw address to be split.
+
+    Returns a tuple of the unit (exempli gratia, 'Apt 3' or 'Rear') and
+    the address without it, or of a value of None and the unchanged
+    address if no unit was found.
+    """
+    tokens = address.split()
+    # Normalize each word just once, for looking it up.
+    keys = [normalize_token(token.strip(',.')) for token in tokens]
+    previous_lookup = None
+    for i, token in enumerate(tokens):
+        word = token.strip(',.')
+        # A unit can't be the house number or the street's first word.
+        if i < 2:
+            previous_lookup = lookup(keys[i])
+            continue
+
+        designator = None
+        number = None
+        end = i + 1
+        if word.startswith('#'):
+            # A '#' stands for an apartment number, unless it's followed by
+            # a unit type that doesn't take a number (#rear).
+            number, number_key = word[1:], keys[i][1:]
+            if not number and not token.endswith(',') and end < len(tokens):
+                number, number_key = tokens[end].strip(',.'), keys[end]
+                end += 1
+            if not number:
+                break
+            number_lookup = lookup(number_key)
+            if number_lookup.unit and not number_lookup.unit_takes_number:
+                designator, number = number_lookup.unit, None
+            else:
+                designator = 'Apt'
+        else:
+            token_lookup = lookup(keys[i])
+            if token_lookup.unit and token_lookup.unit_takes_number \
+                    and not token.endswith(',') and end < len(tokens):
+                candidate = tokens[end].strip(',.').lstrip('#')
+                if candidate and (len(candidate) == 1 or [
+                        character for character in candidate
+                        if character.isdigit()]):
+                    designator, number = word, candidate
+                    end += 1
+            elif token_lookup.unit and previous_lookup is not None \
+                    and previous_lookup.suffix \
+                    and (token.endswith(',') or end == len(tokens)):
+                # Only when the street ends with it, so the first word of a
+                # city (Upper Saddle River, Front Royal) isn't taken for one.
+                designator = word
+            previous_lookup = token_lookup
+
+        if designator:
+            # Keep the punctuation that followed the unit (usually a comma
+            # separating the street from the city).
+            trailing = tokens[end - 1][len(tokens[end - 1].rstrip(',')):]
+            remainder = tokens[:i]
+            if trailing and remainder:
+                remainder[-1] = remainder[-1].rstrip(',') + trailing
+            unit = designator
+            if number:
+                unit = " ".join([designator, number])
+            return unit, " ".join(remainder + tokens[end:])
+
+    return None, address
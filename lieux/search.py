@@ -3,6 +3,8 @@ from django.conf import settings
 
 
 # Imports from lieux.
+from lieux.cache import cache_failure, cache_results, get_cached_results, \
+    raise_cached_failure
 from lieux.exceptions import AddressNotFoundError, IntersectionInputError, \
     IntersectionNotFoundError, NoResultsError
 from lieux.address import geocode_address
@@ -32,10 +34,11 @@ def search(search_string, max_results=10, db_alias=None):
     confidence each result matches the query, if results are found.
     Otherwise returns a value of None.
     """
-    # Before anything else, SQL-escape the address by removing any single and
-    # double quotes from the raw string. This may screw with some obscure
-    # addresses that have apostrophes; we'll have to see if it does.
-    search_string = search_string.replace("'", "").replace('"', '')
+    # Before anything else, remove any double quotes from the raw string; they
+    # mean nothing in an address and would otherwise end up in its components.
+    # Apostrophes (as in O'Connor St.) are safe to keep, since every query is
+    # sent to the geocoder with its values bound as parameters.
+    search_string = search_string.replace('"', '')
 
     # Unless otherwise specified, the database alias will be that which has
     # been specified in settings.GEOCODER_DB_ALIAS (or, failing that, the
@@ -47,6 +50,20 @@ def search(search_string, max_results=10, db_alias=None):
                 'geocoder'
             )
 
+    # If these results have already been cached, return them.
+    cached_results = get_cached_results(
+            'search',
+            search_string,
+            max_results,
+            db_alias
+        )
+    if cached_results is not None:
+        return cached_results
+
+    # If this search came up empty recently, fail the same way again without
+    # going to the database.
+    raise_cached_failure('search', search_string, db_alias)
+
     # Search for a match. If the address string includes an '@' symbol, look no
     # further and start processing the input as an intersection. Else if the
     # string has a match for one of the other union symbols, parse to see if it
@@ -104,7 +121,11 @@ def search(search_string, max_results=10, db_alias=None):
                     db_alias=db_alias
                 )
         except AddressNotFoundError:
-            raise NoResultsError("No matching addresses or intersections " \
+            error = NoResultsError("No matching addresses or intersections " \
                                 "were found based on your search.")
+            cache_failure('search', search_string, db_alias, error)
+            raise error
+
+    cache_results('search', search_string, max_results, db_alias, results)
 
     return results
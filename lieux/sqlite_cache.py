@@ -0,0 +1,204 @@
+# Imports from python.
+import os
+import sqlite3
+import threading
+import time
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+
+# Imports from django.
+from django.core.cache.backends.base import BaseCache
+try:
+    from django.core.cache.backends.base import DEFAULT_TIMEOUT
+except ImportError:
+    # Before Django 1.6, a timeout of None meant the cache's default.
+    DEFAULT_TIMEOUT = None
+
+
+class SQLiteCache(BaseCache):
+    """
+    A Django cache backend that keeps its entries in a SQLite database
+    on disk, so cached geocoding results survive restarts and are shared
+    by every worker process on the machine. SQLite's write-ahead log
+    lets any number of processes read from the cache while one writes.
+
+    Configure it in your CACHES setting, with LOCATION set to the path
+    of the database file:
+
+        CACHES = {
+            'geocoder': {
+                'BACKEND': 'lieux.sqlite_cache.SQLiteCache',
+                'LOCATION': '/var/cache/lieux/geocoder.sqlite3',
+            },
+        }
+
+    Results cached under an earlier GEOCODER_DATA_VERSION are left in
+    place (they're no longer looked up, since the version is part of
+    every key) until they expire or are culled.
+    """
+    def __init__(self, location, params):
+        BaseCache.__init__(self, params)
+        self.location = location
+        options = params.get('OPTIONS', {})
+        self.busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self.local = threading.local()
+
+    def get_connection(self):
+        """
+        Returns this thread's connection to the cache file, opening it
+        (and setting up the file, if need be) the first time.
+        """
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(self.location)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            connection = sqlite3.connect(
+                    self.location,
+                    timeout=self.busy_timeout,
+                    isolation_level=None
+                )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.set_up(connection)
+            self.local.connection = connection
+        return connection
+
+    def set_up(self, connection):
+        """
+        Creates the cache's table if it doesn't exist yet.
+        """
+        connection.execute(
+                'CREATE TABLE IF NOT EXISTS lieux_cache ('
+                'key TEXT PRIMARY KEY, value BLOB, expires REAL)'
+            )
+        connection.execute(
+                'CREATE INDEX IF NOT EXISTS lieux_cache_expires '
+                'ON lieux_cache (expires)'
+            )
+
+    def get_expiry(self, timeout):
+        """
+        Returns the time at which an entry set with the given timeout
+        expires: the cache's default timeout from now, if none is given,
+        or never (infinitely far off, which sorts after every other
+        entry when culling), if the timeout is None.
+        """
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return float('inf')
+        return time.time() + timeout
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self.get_connection()
+        connection.execute(
+                'DELETE FROM lieux_cache WHERE key = ? AND expires < ?',
+                (key, time.time())
+            )
+        cursor = connection.execute(
+                'INSERT OR IGNORE INTO lieux_cache VALUES (?, ?, ?)',
+                (
+                    key,
+                    sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)),
+                    self.get_expiry(timeout)
+                )
+            )
+        if cursor.rowcount:
+            self.cull(connection)
+        return bool(cursor.rowcount)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self.get_connection().execute(
+                'SELECT value FROM lieux_cache WHERE key = ? AND expires >= ?',
+                (key, time.time())
+            ).fetchone()
+        if row is None:
+            return default
+        return pickle.loads(bytes(row[0]))
+
+    def get_many(self, keys, version=None):
+        key_map = {}
+        for key in keys:
+            cache_key = self.make_key(key, version=version)
+            self.validate_key(cache_key)
+            key_map[cache_key] = key
+        if not key_map:
+            return {}
+        rows = self.get_connection().execute(
+                'SELECT key, value FROM lieux_cache WHERE key IN (%s) '
+                'AND expires >= ?' % ', '.join(['?'] * len(key_map)),
+                list(key_map.keys()) + [time.time()]
+            ).fetchall()
+        return dict(
+            (key_map[row[0]], pickle.loads(bytes(row[1]))) for row in rows
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self.get_connection()
+        connection.execute(
+                'INSERT OR REPLACE INTO lieux_cache VALUES (?, ?, ?)',
+                (
+                    key,
+                    sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)),
+                    self.get_expiry(timeout)
+                )
+            )
+        self.cull(connection)
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self.get_connection().execute(
+                'DELETE FROM lieux_cache WHERE key = ?',
+                (key,)
+            )
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self.get_connection().execute(
+                'SELECT 1 FROM lieux_cache WHERE key = ? AND expires >= ?',
+                (key, time.time())
+            ).fetchone() is not None
+
+    def clear(self):
+        self.get_connection().execute('DELETE FROM lieux_cache')
+
+    def cull(self, connection):
+        """
+        Once the cache holds more than its maximum number of entries,
+        drops the expired ones and then, if need be, a share of those
+        closest to expiring (as set by the cache's CULL_FREQUENCY).
+        """
+        count = connection.execute(
+                'SELECT COUNT(*) FROM lieux_cache'
+            ).fetchone()[0]
+        if count <= self._max_entries:
+            return
+        connection.execute(
+                'DELETE FROM lieux_cache WHERE expires < ?',
+                (time.time(),)
+            )
+        count = connection.execute(
+                'SELECT COUNT(*) FROM lieux_cache'
+            ).fetchone()[0]
+        if count > self._max_entries:
+            if self._cull_frequency == 0:
+                connection.execute('DELETE FROM lieux_cache')
+            else:
+                connection.execute(
+                        'DELETE FROM lieux_cache WHERE key IN ('
+                        'SELECT key FROM lieux_cache ORDER BY expires '
+                        'LIMIT ?)',
+                        (count // self._cull_frequency,)
+                    )
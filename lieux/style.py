@@ -625,3 +625,84 @@ TEXTUAL_TO_NUMERIC_ORDINALS = {
     'ninty ninth': '99th',
     'nintyninth': '99th',
 }
+
+
+# The cities in our coverage area, keyed by their lowercased names, in the
+# capitalization they're published in. Names found here skip titlecase()
+# (which also gets a few of them wrong, e.g. Fond du Lac).
+CITY_NAMES_TO_STYLE = {
+    'bayside': 'Bayside',
+    'big bend': 'Big Bend',
+    'brookfield': 'Brookfield',
+    'brown deer': 'Brown Deer',
+    'burlington': 'Burlington',
+    'butler': 'Butler',
+    'caledonia': 'Caledonia',
+    'cedarburg': 'Cedarburg',
+    'chenequa': 'Chenequa',
+    'cudahy': 'Cudahy',
+    'de pere': 'De Pere',
+    'delafield': 'Delafield',
+    'dousman': 'Dousman',
+    'eagle': 'Eagle',
+    'elkhorn': 'Elkhorn',
+    'elm grove': 'Elm Grove',
+    'fond du lac': 'Fond du Lac',
+    'fox point': 'Fox Point',
+    'franklin': 'Franklin',
+    'genesee depot': 'Genesee Depot',
+    'germantown': 'Germantown',
+    'glendale': 'Glendale',
+    'grafton': 'Grafton',
+    'green bay': 'Green Bay',
+    'greendale': 'Greendale',
+    'greenfield': 'Greenfield',
+    'hales corners': 'Hales Corners',
+    'hartford': 'Hartford',
+    'hartland': 'Hartland',
+    'jackson': 'Jackson',
+    'kenosha': 'Kenosha',
+    'kewaskum': 'Kewaskum',
+    'lac la belle': 'Lac La Belle',
+    'lake geneva': 'Lake Geneva',
+    'lannon': 'Lannon',
+    'madison': 'Madison',
+    'mcfarland': 'McFarland',
+    'menomonee falls': 'Menomonee Falls',
+    'mequon': 'Mequon',
+    'milwaukee': 'Milwaukee',
+    'mount pleasant': 'Mount Pleasant',
+    'mukwonago': 'Mukwonago',
+    'muskego': 'Muskego',
+    'new berlin': 'New Berlin',
+    'north prairie': 'North Prairie',
+    'oak creek': 'Oak Creek',
+    'oconomowoc': 'Oconomowoc',
+    'oconomowoc lake': 'Oconomowoc Lake',
+    'oshkosh': 'Oshkosh',
+    'pewaukee': 'Pewaukee',
+    'pleasant prairie': 'Pleasant Prairie',
+    'port washington': 'Port Washington',
+    'racine': 'Racine',
+    'river hills': 'River Hills',
+    'saukville': 'Saukville',
+    'sheboygan': 'Sheboygan',
+    'shorewood': 'Shorewood',
+    'slinger': 'Slinger',
+    'south milwaukee': 'South Milwaukee',
+    'st francis': 'St Francis',
+    'sturtevant': 'Sturtevant',
+    'sussex': 'Sussex',
+    'thiensville': 'Thiensville',
+    'wales': 'Wales',
+    'waterford': 'Waterford',
+    'watertown': 'Watertown',
+    'waukesha': 'Waukesha',
+    'wauwatosa': 'Wauwatosa',
+    'west allis': 'West Allis',
+    'west bend': 'West Bend',
+    'west milwaukee': 'West Milwaukee',
+    'whitefish bay': 'Whitefish Bay',
+    'whitewater': 'Whitewater',
+    'wind lake': 'Wind Lake',
+}
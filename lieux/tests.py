@@ -0,0 +1,445 @@
+# Imports from python.
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+
+# Imports from django.
+from django.conf import settings
+from django.core.management import call_command
+from django.test.utils import override_settings
+
+
+# When the tests are run on their own (under pytest, say) rather than by a
+# Django project's test runner, set up just enough of a project for them.
+if not settings.configured:
+    settings.configure(
+        INSTALLED_APPS=['lieux'],
+        DATABASES={
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': ':memory:',
+            },
+        },
+    )
+    import django
+    if hasattr(django, 'setup'):
+        django.setup()
+
+
+# The directory lieux is installed in, so fresh processes can import it.
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_in_fresh_process(script):
+    """
+    Runs a Python script in a new interpreter (so nothing this process
+    has already imported or set up is shared with it), with lieux on
+    its path.
+
+    Returns a tuple of the script's exit code and anything it wrote to
+    standard error.
+    """
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join(
+            [PACKAGE_ROOT] + [
+                path for path in [environment.get('PYTHONPATH')] if path
+            ]
+        )
+    process = subprocess.Popen(
+            [sys.executable, '-c', textwrap.dedent(script)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=environment
+        )
+    errors = process.communicate()[1]
+    return process.returncode, errors
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    def test_pool_opens_connection_in_fresh_process(self):
+        """
+        A pool's first connection should open even if nothing in the
+        process has touched Django's own connection to that database
+        yet (and so Django hasn't filled in its default settings).
+        """
+        returncode, errors = run_in_fresh_process("""
+            from django.conf import settings
+            settings.configure(DATABASES={
+                'default': {
+                    'ENGINE': 'django.db.backends.sqlite3',
+                    'NAME': ':memory:',
+                },
+                'geocoder': {
+                    'ENGINE': 'django.db.backends.sqlite3',
+                    'NAME': ':memory:',
+                },
+            })
+            import django
+            if hasattr(django, 'setup'):
+                django.setup()
+
+            from lieux.connection_pool import GeocoderConnectionPool
+            pool = GeocoderConnectionPool('geocoder', 1)
+            with pool.connection() as connection:
+                cursor = connection.cursor()
+                cursor.execute('SELECT 1')
+                assert cursor.fetchone()[0] == 1
+        """)
+        self.assertEqual(returncode, 0, errors)
+
+
+class ResultCacheKeyTests(unittest.TestCase):
+    @override_settings(
+        GEOCODER_FAST_NORMALIZER=True,
+        DEFAULT_GEOCODER_STATE='Wisconsin'
+    )
+    def test_default_state_shares_key_with_abbreviation(self):
+        """
+        An address that takes the default state should be cached under
+        the same key as one that spells out that state's abbreviation.
+        """
+        # Imports from lieux.
+        from lieux.address import normalize_address, prepare_for_geocoder
+        from lieux.cache import result_cache_key
+
+        keys = []
+        for address in [
+                '333 W. State St., Milwaukee',
+                '333 west state street milwaukee wi']:
+            normalized_address = normalize_address(address, 'geocoder')
+            prepare_for_geocoder(normalized_address)
+            keys.append(result_cache_key(
+                    'address',
+                    normalized_address,
+                    10,
+                    'geocoder'
+                ))
+        self.assertEqual(keys[0], keys[1])
+
+
+class GridAddressTests(unittest.TestCase):
+    @override_settings(GEOCODER_FAST_NORMALIZER=True)
+    def test_geocoder_gets_plain_house_number(self):
+        """
+        The geocoder should be sent the house number that stands in for
+        a grid number, while the normalized address keeps the grid
+        number for the results.
+        """
+        # Imports from lieux.
+        from lieux.address import normalize_address, prepare_for_geocoder
+
+        normalized_address = normalize_address(
+                'N109W1711 Ava Cir, Germantown, WI',
+                'geocoder'
+            )
+        self.assertEqual(
+                prepare_for_geocoder(normalized_address),
+                '1711 Ava Cir Germantown WI'
+            )
+        self.assertEqual(normalized_address[0], 'N109W1711')
+
+
+class SecondaryUnitTests(unittest.TestCase):
+    def test_units_are_split_off(self):
+        # Imports from lieux.
+        from lieux.parser import split_secondary_unit
+
+        for address, expected in [
+                ('123 Main St #3, Milwaukee',
+                        ('Apt 3', '123 Main St, Milwaukee')),
+                ('123 Main St # 3, Milwaukee',
+                        ('Apt 3', '123 Main St, Milwaukee')),
+                ('123 Main St Apt 3 Milwaukee',
+                        ('Apt 3', '123 Main St Milwaukee')),
+                ('123 Main St Rear, Milwaukee',
+                        ('Rear', '123 Main St, Milwaukee')),
+                ('123 Main St Rear', ('Rear', '123 Main St'))]:
+            self.assertEqual(split_secondary_unit(address), expected)
+
+    def test_number_isnt_taken_across_a_comma(self):
+        # Imports from lieux.
+        from lieux.parser import split_secondary_unit
+
+        unit, address = split_secondary_unit('123 W Main St #, Madison')
+        self.assertEqual(unit, None)
+        self.assertTrue(address.endswith('Madison'))
+
+    def test_city_isnt_taken_for_a_unit(self):
+        # Imports from lieux.
+        from lieux.parser import split_secondary_unit
+
+        for address in [
+                '12 Main St Upper Saddle River NJ',
+                '12 Main St Front Royal VA',
+                '5 Lake Rd Lower Lake CA',
+                '5 Pine Ave Side Lake MN']:
+            self.assertEqual(split_secondary_unit(address), (None, address))
+
+
+class SQLiteCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        # Imports from python.
+        import shutil
+
+        shutil.rmtree(self.directory)
+
+    def get_cache(self, **options):
+        # Imports from lieux.
+        from lieux.sqlite_cache import SQLiteCache
+
+        return SQLiteCache(
+                os.path.join(self.directory, 'geocoder.sqlite3'),
+                {'TIMEOUT': 60, 'OPTIONS': options}
+            )
+
+    def test_none_timeout_never_expires(self):
+        cache = self.get_cache()
+        cache.set('forever', 1, None)
+        cache.set('default', 2)
+        cache.set('gone', 3, -1)
+        self.assertEqual(cache.get('forever'), 1)
+        self.assertEqual(cache.get('default'), 2)
+        self.assertEqual(cache.get('gone'), None)
+        self.assertEqual(
+                cache.get_connection().execute(
+                        "SELECT expires FROM lieux_cache WHERE key = ?",
+                        (cache.make_key('forever'),)
+                    ).fetchone()[0],
+                float('inf')
+            )
+
+    def test_entries_survive_reopening(self):
+        self.get_cache().set('kept', 1)
+        with override_settings(GEOCODER_DATA_VERSION='tiger2099'):
+            self.assertEqual(self.get_cache().get('kept'), 1)
+
+
+class WarmCommandTests(unittest.TestCase):
+    @override_settings(
+        CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'lieux-warm-test': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'lieux-warm-test',
+            },
+        },
+        GEOCODER_RESULT_CACHE='lieux-warm-test'
+    )
+    def test_warms_each_query_once(self):
+        """
+        The command should run each distinct query in the file (skipping
+        blank lines and comments) and report which failed.
+        """
+        # Imports from lieux.
+        from lieux.cache import cache_results, get_cached_results
+        from lieux.management.commands import lieux_warm
+
+        # Stand in for the geocoder, caching each query's "results" the way
+        # search() would.
+        def fake_search(query, max_results=10, db_alias=None):
+            if query == 'nowhere':
+                raise ValueError('No results.')
+            cache_results('search', query, max_results, db_alias, [query])
+            return [query]
+
+        query_file = tempfile.NamedTemporaryFile(
+                mode='w',
+                suffix='.txt',
+                delete=False
+            )
+        query_file.write(
+                '333 W. State St., Milwaukee\n'
+                '\n'
+                '# A comment\n'
+                '333 W. State St., Milwaukee\n'
+                'nowhere\n'
+                '1st and Main, Madison\n'
+            )
+        query_file.close()
+
+        real_search = lieux_warm.search
+        lieux_warm.search = fake_search
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        try:
+            call_command(
+                    'lieux_warm',
+                    query_file.name,
+                    concurrency=2,
+                    max_results=5,
+                    database='default',
+                    stdout=stdout,
+                    stderr=stderr
+                )
+        finally:
+            lieux_warm.search = real_search
+            os.remove(query_file.name)
+
+        self.assertTrue(
+                stdout.getvalue().startswith('Warmed 2 of 3 queries'),
+                stdout.getvalue()
+            )
+        self.assertIn('Failed: nowhere', stderr.getvalue())
+        self.assertEqual(
+                get_cached_results(
+                        'search',
+                        '1st and Main, Madison',
+                        5,
+                        'default'
+                    ),
+                ['1st and Main, Madison']
+            )
+
+
+class LookupTests(unittest.TestCase):
+    def test_lookup_takes_normalized_keys(self):
+        # Imports from lieux.
+        from lieux.lookups import EMPTY_LOOKUP, lookup, normalize_token
+
+        self.assertEqual(lookup(normalize_token('St.')).suffix_usps, 'St')
+        self.assertEqual(lookup('north west').direction, 'NW')
+        self.assertEqual(lookup('St.'), EMPTY_LOOKUP)
+
+    def test_index_cant_be_changed(self):
+        # Imports from lieux.
+        from lieux.lookups import get_token_index
+
+        index = get_token_index()
+        self.assertFalse(hasattr(index, 'entries'))
+        def change_index():
+            index['st'] = None
+        self.assertRaises(TypeError, change_index)
+
+
+class ParseAddressTests(unittest.TestCase):
+    def test_plain_addresses_are_parsed(self):
+        # Imports from lieux.
+        from lieux.parser import parse_address
+
+        for address, expected in [
+                ('333 W. State St., Milwaukee',
+                        ['333', 'W', 'State', 'St', '', '', 'Milwaukee', '',
+                                '', 't']),
+                ('333 W State St, Milwaukee, WI 53203',
+                        ['333', 'W', 'State', 'St', '', '', 'Milwaukee', 'WI',
+                                '53203', 't']),
+                ('333 W State St, Milwaukee WI 53203',
+                        ['333', 'W', 'State', 'St', '', '', 'Milwaukee', 'WI',
+                                '53203', 't']),
+                ('333 west state street milwaukee wi',
+                        ['333', 'W', 'state', 'St', '', '', 'milwaukee', 'WI',
+                                '', 't']),
+                ('123 Main St, Port Washington, WI 53074',
+                        ['123', '', 'Main', 'St', '', '', 'Port Washington',
+                                'WI', '53074', 't']),
+                ('1 Main St, Spokane, Washington',
+                        ['1', '', 'Main', 'St', '', '', 'Spokane', 'WA', '',
+                                't'])]:
+            self.assertEqual(parse_address(address), expected)
+
+    def test_ambiguous_states_are_left_to_the_database(self):
+        """
+        A state name that could just as well be (or be part of) the city
+        shouldn't be guessed at.
+        """
+        # Imports from lieux.
+        from lieux.parser import parse_address
+
+        for address in [
+                '123 Main St, Port Washington',
+                '1 Court St, Washington',
+                '12 Elm St, Indiana']:
+            self.assertEqual(parse_address(address), None)
+
+    def test_unclear_addresses_are_left_to_the_database(self):
+        # Imports from lieux.
+        from lieux.parser import parse_address
+
+        for address in [
+                '123 Main St #3, Milwaukee',
+                '123A Main St, Milwaukee',
+                '123 North Ave, Milwaukee',
+                '123 Main St Oak Ave Milwaukee',
+                '123 State St West Allis',
+                '123 Main St, Milwaukee, WI 53203-1234']:
+            self.assertEqual(parse_address(address), None)
+
+
+class GeocoderFunctionTests(unittest.TestCase):
+    class FakeCursor(object):
+        """
+        Records the statements it's given, answering version checks
+        with the given version and failing the first CREATE statement
+        with the given error.
+        """
+        def __init__(self, version, create_error=None):
+            self.version = version
+            self.create_error = create_error
+            self.statements = []
+
+        def execute(self, statement, parameters=None):
+            self.statements.append(statement.split('(')[0].strip())
+            if statement.startswith('CREATE') and self.create_error:
+                error, self.create_error = self.create_error, None
+                raise error
+
+        def fetchone(self):
+            return [self.version]
+
+    def replace(self, cursor):
+        # Imports from lieux.
+        from lieux.db_connection import (
+            GEOCODER_FUNCTIONS, register_geocoder_function,
+            replace_geocoder_function
+        )
+
+        register_geocoder_function(
+                'lieux_test_function()',
+                'CREATE OR REPLACE FUNCTION lieux_test_function() ...'
+            )
+        try:
+            replace_geocoder_function(cursor, 'lieux_test_function()')
+        finally:
+            del GEOCODER_FUNCTIONS['lieux_test_function()']
+        return [
+            statement for statement in cursor.statements
+            if not statement.startswith('SELECT obj_description')
+        ]
+
+    def test_function_is_replaced_in_place(self):
+        cursor = self.FakeCursor('lieux:old')
+        self.assertEqual(self.replace(cursor), [
+            'BEGIN',
+            'SELECT pg_advisory_xact_lock',
+            'SAVEPOINT lieux_replace_function',
+            'CREATE OR REPLACE FUNCTION lieux_test_function',
+            'COMMENT ON FUNCTION lieux_test_function',
+            'COMMIT',
+        ])
+
+    def test_function_is_dropped_only_if_it_cant_be_replaced(self):
+        # Imports from django.
+        from django.db import DatabaseError
+
+        cursor = self.FakeCursor('lieux:old', DatabaseError())
+        self.assertEqual(self.replace(cursor), [
+            'BEGIN',
+            'SELECT pg_advisory_xact_lock',
+            'SAVEPOINT lieux_replace_function',
+            'CREATE OR REPLACE FUNCTION lieux_test_function',
+            'ROLLBACK TO SAVEPOINT lieux_replace_function',
+            'DROP FUNCTION IF EXISTS lieux_test_function',
+            'CREATE OR REPLACE FUNCTION lieux_test_function',
+            'COMMENT ON FUNCTION lieux_test_function',
+            'COMMIT',
+        ])
@@ -97,17 +97,17 @@ def google_style(request, max_results=10, db_alias=None):
 
         # Attach the location's street address number to the per-address
         # values, if it has been given.
-        if address_components[0] != '':
+        if address_components.number != '':
             new_component = {
                 'types': ['street_number'],
-                'short_name': address_components[0],
-                'long_name': address_components[0],
+                'short_name': address_components.number,
+                'long_name': address_components.number,
             }
             json_result['address_components'].append(new_component)
 
         # Attach the street name to the per-address values, if it has been
         # given.
-        if address_components[2] != '':
+        if address_components.street != '':
             address_street = [item for item in address_components[1:5] \
                                 if item != '']
             new_component = {
@@ -119,39 +119,39 @@ def google_style(request, max_results=10, db_alias=None):
 
         # Attach the apartment number to the per-address values, if it has been
         # given.
-        if address_components[5] != '':
+        if address_components.unit != '':
             new_component = {
                 'types': ['subpremise'],
-                'short_name': address_components[5].strip('"'),
-                'long_name': address_components[5].strip('"'),
+                'short_name': address_components.unit,
+                'long_name': address_components.unit,
             }
             json_result['address_components'].append(new_component)
 
         # Attach the city name to the per-address values, if it has been given.
-        if address_components[6] != '':
+        if address_components.city != '':
             new_component = {
                 'types': ['locality', 'political'],
-                'short_name': address_components[6],
-                'long_name': address_components[6],
+                'short_name': address_components.city,
+                'long_name': address_components.city,
             }
             json_result['address_components'].append(new_component)
 
         # Attach the state to the per-address values, if it has been given.
-        if address_components[7] != '':
+        if address_components.state != '':
             new_component = {
                 'types': ['administrative_area_level_1', 'political'],
-                'short_name': address_components[7],
-                'long_name': address_components[7],
+                'short_name': address_components.state,
+                'long_name': address_components.state,
             }
             json_result['address_components'].append(new_component)
 
         # Attach the postal (ZIP) code to the per-address values, if it has
         # been given.
-        if address_components[8] != '':
+        if address_components.zip != '':
             new_component = {
                 'types': ['postal_code'],
-                'short_name': address_components[8],
-                'long_name': address_components[8],
+                'short_name': address_components.zip,
+                'long_name': address_components.zip,
             }
             json_result['address_components'].append(new_component)
 
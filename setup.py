@@ -5,10 +5,15 @@ setup(
     version='0.5.7',
     author='Allan James Vestal',
     author_email='ajvestal@journalsentinel.com',
-    packages=['lieux'],
+    packages=[
+        'lieux',
+        'lieux.management',
+        'lieux.management.commands',
+    ],
     description='A Djangonic wrapper around the PostGIS geocoder that emulates the Google Maps geocoder\'s API.',
     long_description=open('README.textile').read(),
     install_requires=[
         "Django >= 1.4",
+        "titlecase",
     ],
 )